@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark für die Essensgeld-Konvertierung auf großen Kantinen-Exporten.
+
+Vergleicht die ursprüngliche Konvertierung mit df.iterrows() (Betragsspalte je Zeile gesucht)
+mit der spaltenweisen Variante (Betragsspalte einmal bestimmt, Maske für Beträge ungleich 0,
+Formatierung der ganzen Spalte). Gemessen wird die Umwandlung des eingelesenen DataFrames
+inkl. CSV-Ausgabe; beide Varianten müssen identische CSVs erzeugen.
+
+Aufruf aus dem Projektverzeichnis:
+    python -m benchmarks.bench_essensgeld_converter [--rows 50000] [--repeat 3]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from workflows.csv_output import CsvRecordWriter
+from workflows.essensgeld_workflow import essensgeld_records
+
+
+def synthetic_export(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Export wie pd.read_excel(header=0): eine Zeile je Essen, ein Teil ohne Zuschuss (0 oder leer)"""
+    rng = np.random.default_rng(seed)
+    amounts = np.round(rng.choice([0.0, 2.5, 3.1, 4.75, np.nan], size=n_rows) * rng.integers(1, 4, size=n_rows), 2)
+    return pd.DataFrame({
+        "Personalnummer": rng.integers(1000, 9999, size=n_rows),
+        "Name": [f"Mitarbeiter {i % 500}" for i in range(n_rows)],
+        "Datum": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 31, size=n_rows), unit="D"),
+        " Summe Essensgeld PK ": amounts,
+    })
+
+
+def convert(df: pd.DataFrame, engine: str) -> bytes:
+    with CsvRecordWriter() as writer:
+        writer.write_rows(essensgeld_records(df.copy(), "10001", "202401", engine))
+    return writer.getvalue()
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_export(args.rows)
+    assert convert(df, "legacy") == convert(df, "vectorized")
+
+    legacy = best_of(lambda: convert(df, "legacy"), args.repeat)
+    vectorized = best_of(lambda: convert(df, "vectorized"), args.repeat)
+    print(f"Zeilen: {args.rows}")
+    print(f"iterrows:     {legacy * 1000:8.1f} ms")
+    print(f"spaltenweise: {vectorized * 1000:8.1f} ms  ({legacy / vectorized:.1f}x schneller)")
+
+
+if __name__ == "__main__":
+    main()
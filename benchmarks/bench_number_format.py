@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Micro-Benchmark für die Formatierung von Beträgen im deutschen Format.
+
+Vergleicht den bisher in den Konvertern kopierten Ausdruck (f"{num:,.2f}" mit drei
+str.replace pro Wert) mit format_number_german und der spaltenweisen Variante
+format_numbers_german und gibt die Kosten pro Zeile aus. Vorher wird geprüft, dass alle
+Varianten für Randfälle (negative Werte, -0,00, Rundung auf ,5, NaN/inf) identisch formatieren.
+
+Aufruf aus dem Projektverzeichnis:
+    python -m benchmarks.bench_number_format [--rows 200000] [--repeat 5]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from workflows.number_format import format_number_german, format_numbers_german
+
+EDGE_CASES = [
+    0.0, -0.0, -0.001, 0.005, 0.015, 0.125, 1.005, 2.675, -2.675, 999.995, 1000.0, -1000.0,
+    1234567.891, 1e12, -1e15, float("nan"), float("inf"), float("-inf"), 1e-300, -1e-300, 0.5, -0.5,
+]
+
+
+def legacy_format(num) -> str:
+    return f"{float(num):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def synthetic_amounts(n_rows: int, seed: int = 42) -> np.ndarray:
+    """Beträge wie in Lohnexporten: überwiegend zweistellig gerundet, einige Stunden und große Summen"""
+    rng = np.random.default_rng(seed)
+    amounts = np.round(rng.lognormal(mean=5, sigma=2, size=n_rows), 2)
+    amounts[rng.random(n_rows) < 0.1] *= -1
+    hours = rng.random(n_rows) < 0.2
+    amounts[hours] = np.round(rng.uniform(0, 200, size=int(hours.sum())), 1)
+    return amounts
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    edge = np.array(EDGE_CASES)
+    assert [legacy_format(v) for v in edge] == [format_number_german(v) for v in edge] == format_numbers_german(edge)
+
+    amounts = synthetic_amounts(args.rows)
+    values = amounts.tolist()
+    assert [legacy_format(v) for v in values] == format_numbers_german(amounts)
+
+    timings = {
+        "bisher (inline)": best_of(lambda: [legacy_format(v) for v in values], args.repeat),
+        "format_number_german": best_of(lambda: [format_number_german(v) for v in values], args.repeat),
+        "format_numbers_german": best_of(lambda: format_numbers_german(amounts), args.repeat),
+    }
+    baseline = timings["bisher (inline)"]
+    print(f"Zeilen: {args.rows}")
+    for name, seconds in timings.items():
+        print(f"{name:24s} {seconds * 1000:8.1f} ms  {seconds / args.rows * 1e9:7.0f} ns/Zeile  "
+              f"({baseline / seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark für die Pflegeheim-Konvertierung auf breiten Arbeitsblättern.
+
+Vergleicht die ursprüngliche zeilenweise Konvertierung (df.iloc je Zelle, Lohnart-Code je Zelle
+per re.sub bereinigt) mit der spaltenweisen Variante (Lohnart-Spalten einmal aufgelöst, Datenblock
+im Langformat, Masken statt Einzelprüfungen). Gemessen wird die Umwandlung des bereits
+eingelesenen DataFrames inkl. CSV-Ausgabe; beide Varianten müssen identische CSVs erzeugen.
+
+Aufruf aus dem Projektverzeichnis:
+    python -m benchmarks.bench_pfleger_converter [--rows 500] [--cols 120] [--repeat 3]
+"""
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from workflows.csv_output import CsvRecordWriter
+from workflows.pfleger_workflow import FIRST_LOHNART_COLUMN, pfleger_records
+
+
+def synthetic_sheet(n_rows: int, n_cols: int, seed: int = 42) -> pd.DataFrame:
+    """Arbeitsblatt wie pd.read_excel(header=None): zwei Kopfzeilen, dann eine Zeile je Mitarbeiter"""
+    rng = random.Random(seed)
+    width = FIRST_LOHNART_COLUMN + n_cols
+    title = ["Pflegeheim Export"] + [None] * (width - 1)
+    codes = [None] * FIRST_LOHNART_COLUMN + [
+        rng.choice([f"LA {1000 + c}", 2000 + c, f"{c}0 Zuschlag", "Bemerkung", None]) for c in range(n_cols)
+    ]
+    rows = [title, codes]
+    for r in range(n_rows):
+        row = [100 + r, "Name", None, rng.choice([None, "KST 5", 4711])]
+        for _ in range(n_cols):
+            row.append(rng.choice([None, None, None, 8, 7.5, round(rng.uniform(0, 500), 2), "1,5", "12", "abc", 0]))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def convert(df: pd.DataFrame, engine: str) -> bytes:
+    with CsvRecordWriter() as writer:
+        writer.write_many(pfleger_records(df, "10001", "202401", engine))
+    return writer.getvalue()
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--cols", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_sheet(args.rows, args.cols)
+    assert convert(df, "legacy") == convert(df, "vectorized")
+
+    legacy = best_of(lambda: convert(df, "legacy"), args.repeat)
+    vectorized = best_of(lambda: convert(df, "vectorized"), args.repeat)
+    cells = args.rows * args.cols
+    print(f"Zeilen: {args.rows}, Lohnart-Spalten: {args.cols}, Zellen: {cells}")
+    print(f"zeilenweise:  {legacy * 1000:8.1f} ms  {legacy / cells * 1e9:7.0f} ns/Zelle")
+    print(f"spaltenweise: {vectorized * 1000:8.1f} ms  {vectorized / cells * 1e9:7.0f} ns/Zelle  "
+          f"({legacy / vectorized:.1f}x schneller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Lokale Ersatzdienste für Benchmarks und Lasttests, damit keine Anfrage das Netzwerk verlässt:
+
+- FakeTranslator: Übersetzungs-Backend (siehe workflows.translation) mit fester, optional
+  verzögerter Antwort je Chunk
+- SmtpSink: SMTP-Server auf 127.0.0.1 mit STARTTLS (selbstsigniertes Zertifikat über die
+  openssl-Kommandozeile) und AUTH, der alle Nachrichten annimmt und nur zählt
+- FakeMailgunServer: HTTP-Server, der die Mailgun-API (POST /v3/<Domain>/messages) nachbildet
+
+use_mail_stubs() richtet die E-Mail-Konfiguration der App auf diese Dienste aus.
+"""
+import json
+import os
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from workflows.config import EmailSettings, get_email_settings
+from workflows.email_service import close_mailgun_session, close_smtp_pools, init_transport_registry
+
+
+class FakeTranslator:
+    """Übersetzt jeden Text zu "de:<Text>"; latency_seconds simuliert die Antwortzeit je Anfrage"""
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.requests = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def translate_batch(self, texts: List[str], source: str, target: str) -> List[str]:
+        with self._lock:
+            self.requests += 1
+            self.texts += len(texts)
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return [f"{target}:{text}" for text in texts]
+
+
+def _self_signed_certificate(directory: str) -> ssl.SSLContext:
+    cert, key = os.path.join(directory, "sink.crt"), os.path.join(directory, "sink.key")
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+            check=True, capture_output=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise RuntimeError(f"Zertifikat für den SMTP-Sink konnte nicht erzeugt werden (openssl benötigt): {e}")
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Minimaler SMTP-Dialog: EHLO, STARTTLS, AUTH, MAIL, RCPT, DATA, NOOP, RSET, QUIT"""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        sink: "SmtpSink" = self.server.sink
+        sink._connected()
+        self.reply("220 localhost SMTP-Sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n250 STARTTLS\r\n")
+                self.wfile.flush()
+            elif verb == "STARTTLS":
+                self.reply("220 Ready to start TLS")
+                self.request = sink.tls_context.wrap_socket(self.request, server_side=True)
+                self.rfile = self.request.makefile("rb")
+                self.wfile = self.request.makefile("wb")
+            elif verb == "AUTH":
+                if command.upper().startswith("AUTH LOGIN"):
+                    # Benutzername und Passwort werden nacheinander abgefragt (sofern nicht mitgeschickt)
+                    for _ in range(2 if len(command.split()) == 2 else 1):
+                        self.reply("334 VXNlcm5hbWU6")
+                        self.rfile.readline()
+                self.reply("235 Authentication successful")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data == b".\r\n":
+                        break
+                    size += len(data)
+                sink._received(size)
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                # MAIL, RCPT, NOOP, RSET
+                self.reply("250 OK")
+
+
+class _ThreadingSmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SmtpSink:
+    """
+    SMTP-Server in einem Hintergrund-Thread, der alle Nachrichten annimmt und verwirft.
+    Zählt Verbindungen, Nachrichten und Bytes (threadsicher).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._tempdir = tempfile.TemporaryDirectory(prefix="smtp-sink-")
+        self.tls_context = _self_signed_certificate(self._tempdir.name)
+        self.connections = 0
+        self.messages = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingSmtpServer((host, port), _SmtpHandler)
+        self._server.sink = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _connected(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def _received(self, size: int) -> None:
+        with self._lock:
+            self.messages += 1
+            self.bytes_received += size
+
+    def start(self) -> "SmtpSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._tempdir.cleanup()
+
+    def __enter__(self) -> "SmtpSink":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"connections": self.connections, "messages": self.messages, "bytes_received": self.bytes_received}
+
+
+class _MailgunHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        server: "FakeMailgunServer" = self.server.fake
+        size = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(size)
+        if server.latency_seconds:
+            time.sleep(server.latency_seconds)
+        if not self.path.endswith("/messages"):
+            self._respond(404, {"message": "Not Found"})
+            return
+        message_id = server._received(size)
+        self._respond(200, {"id": f"<{message_id}@localhost>", "message": "Queued. Thank you."})
+
+    def _respond(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class FakeMailgunServer:
+    """
+    Mailgun-API auf 127.0.0.1: nimmt jede Nachricht mit 200 an (Keep-Alive wie bei Mailgun),
+    latency_seconds simuliert die Antwortzeit. Zählt Nachrichten und Bytes (threadsicher).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.messages = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _MailgunHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v3"
+
+    def _received(self, size: int) -> int:
+        with self._lock:
+            self.messages += 1
+            self.bytes_received += size
+            return self.messages
+
+    def start(self) -> "FakeMailgunServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-mailgun", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeMailgunServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"messages": self.messages, "bytes_received": self.bytes_received}
+
+
+def use_mail_stubs(smtp: Optional[SmtpSink] = None, mailgun: Optional[FakeMailgunServer] = None) -> EmailSettings:
+    """
+    Richtet den E-Mail-Versand der App auf die lokalen Dienste aus: setzt die Umgebungsvariablen
+    (ein fehlender Dienst = Transport deaktiviert) und baut Einstellungen, Verbindungen und
+    Transport-Registry neu auf. Die Umgebungsvariablen gelten auch für eine danach gestartete App.
+    """
+    os.environ.update({
+        "SENDER_EMAIL": "benchmark@localhost" if smtp else "",
+        "SENDER_PASSWORD": "benchmark" if smtp else "",
+        "SMTP_SERVER": smtp.host if smtp else "",
+        "SMTP_PORT": str(smtp.port) if smtp else "587",
+        "MAILGUN_API_KEY": "key-benchmark" if mailgun else "",
+        "MAILGUN_DOMAIN": "localhost",
+        "MAILGUN_FROM": "benchmark@localhost",
+        "MAILGUN_API_BASE_URL": mailgun.base_url if mailgun else "https://api.mailgun.net/v3",
+    })
+    # Lokale Dienste nie über einen konfigurierten Proxy ansprechen
+    no_proxy = [entry for entry in os.environ.get("NO_PROXY", "").split(",") if entry]
+    os.environ["NO_PROXY"] = ",".join(dict.fromkeys(no_proxy + ["127.0.0.1", "localhost"]))
+    get_email_settings.cache_clear()
+    close_smtp_pools()
+    close_mailgun_session()
+    settings = get_email_settings()
+    # Leere Variablen gelten als nicht gesetzt: Werte aus einer .env-Datei dürfen keinen echten Dienst aktivieren
+    if (not smtp and settings.smtp_configured) or (not mailgun and settings.mailgun_configured):
+        raise RuntimeError("Echter E-Mail-Dienst über .env konfiguriert; Benchmarks ohne .env im Arbeitsverzeichnis starten")
+    init_transport_registry(settings)
+    return settings
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+HTTP-Lasttest für die FastAPI-App: startet main.app im eigenen Prozess (uvicorn, ein Worker) mit
+lokalem SMTP-Sink bzw. Mailgun-Nachbildung und FakeTranslator (benchmarks.fakes) und schickt
+gleichzeitige Multipart-Uploads mit synthetischen Arbeitsmappen (benchmarks.workbooks) an die
+POST-Endpunkte. Je Endpunkt wird die Parallelität stufenweise erhöht; je Stufe werden Durchsatz,
+Latenz (p50/p95/p99) und Fehlerrate gemessen – Grundlage für die Wahl der Worker-Anzahl.
+
+Die Last erzeugen --concurrency gleichzeitige Clients, die ihre Anfragen nacheinander senden
+(geschlossene Schleife). Die Konvertierung läuft wie im Betrieb im Prozess-Pool (CPU_WORKERS),
+Übersetzung und Versand im I/O-Pool (IO_WORKERS). Der Ergebnis-Cache ist deaktiviert, damit jede
+Anfrage wirklich konvertiert wird (--result-cache zum Einschalten).
+
+Aufruf aus dem Projektverzeichnis:
+    python -m benchmarks.loadtest [--endpoints convert,test-email,translate-excel,convert-essensgeld,convert-pfleger]
+        [--concurrency 1,2,4,8,16] [--requests 40] [--rows 300] [--transport smtp|mailgun]
+        [--mail-latency 0] [--translator-latency 0] [--max-error-rate 0.5] [--output loadtest-results.json]
+
+Weitere Endpunkte: convert-sheets, convert-bulk, send-batch.
+"""
+import os
+import sys
+
+# Vor dem Import der App: Konfiguration der Caches und Pools für den Lasttest
+if "--result-cache" not in sys.argv:
+    os.environ["RESULT_CACHE_DIR"] = ""
+os.environ.setdefault("TRANSLATION_CACHE_PATH", "")
+os.environ.setdefault("TRANSLATION_RATE_PER_SECOND", "0")
+
+import argparse
+import datetime
+import json
+import platform
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+import uvicorn
+
+from benchmarks.fakes import FakeMailgunServer, FakeTranslator, SmtpSink, use_mail_stubs
+from benchmarks.workbooks import essensgeld_workbook, payroll_workbook, pfleger_workbook, translate_workbook
+from main import app
+from workflows.executor import CPU_WORKERS, IO_WORKERS
+from workflows.translation import set_translator_backend
+
+RECIPIENT = "lasttest@localhost"
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+DEFAULT_ENDPOINTS = ("convert", "test-email", "translate-excel", "convert-essensgeld", "convert-pfleger")
+
+
+@dataclass
+class Workbooks:
+    payroll: bytes
+    pfleger: bytes
+    essensgeld: bytes
+    translate: bytes
+
+    @classmethod
+    def generate(cls, rows: int, lohnart_columns: int, japanese_density: float) -> "Workbooks":
+        return cls(
+            payroll_workbook(rows, lohnart_columns),
+            pfleger_workbook(rows, lohnart_columns),
+            essensgeld_workbook(rows),
+            translate_workbook(rows, lohnart_columns, japanese_density),
+        )
+
+
+# Multipart-Anfrage: (Formularfelder, Dateien)
+Multipart = Tuple[List[Tuple[str, str]], List[Tuple[str, tuple]]]
+
+
+def _convert(wb: Workbooks) -> Multipart:
+    return [("email", RECIPIENT), ("mandant", "10001")], [("file", ("lohnabrechnung.xlsx", wb.payroll, XLSX))]
+
+
+def _test_email(wb: Workbooks) -> Multipart:
+    return [("email", RECIPIENT)], []
+
+
+def _translate_excel(wb: Workbooks) -> Multipart:
+    return [("email", RECIPIENT)], [("file", ("japanisch.xlsx", wb.translate, XLSX))]
+
+
+def _convert_essensgeld(wb: Workbooks) -> Multipart:
+    return [("email", RECIPIENT), ("mandant", "10001")], [("file", ("essensgeld.xlsx", wb.essensgeld, XLSX))]
+
+
+def _convert_pfleger(wb: Workbooks) -> Multipart:
+    return [("email", RECIPIENT), ("mandant", "10001")], [("file", ("pfleger.xlsx", wb.pfleger, XLSX))]
+
+
+def _convert_sheets(wb: Workbooks) -> Multipart:
+    return [("email", RECIPIENT), ("workflow", "payroll")], [("file", ("lohnabrechnung.xlsx", wb.payroll, XLSX))]
+
+
+def _convert_bulk(wb: Workbooks) -> Multipart:
+    manifest = json.dumps({"pfleger.xlsx": {"workflow": "pfleger"}, "essensgeld.xlsx": {"workflow": "essensgeld"}})
+    files = [
+        ("files", ("lohnabrechnung.xlsx", wb.payroll, XLSX)),
+        ("files", ("pfleger.xlsx", wb.pfleger, XLSX)),
+        ("files", ("essensgeld.xlsx", wb.essensgeld, XLSX)),
+    ]
+    return [("manifest", manifest), ("workflow", "payroll")], files
+
+
+def _send_batch(wb: Workbooks) -> Multipart:
+    csv = b"Mandant;Personalnummer;Abrechnungsmonat;Lohnart;Betrag;Einheit;Kostenstelle\n" + \
+        b"10001;100;202401;111;12,50;EUR;\n" * 200
+    files = [("files", (f"lohnabrechnung_{i}.csv", csv, "text/csv")) for i in range(3)]
+    return [("emails", RECIPIENT)] * 3 + [("abrechnungsmonate", "202401")], files
+
+
+# Endpunkt -> Multipart-Anfrage aus den synthetischen Arbeitsmappen
+ENDPOINTS: Dict[str, Callable[[Workbooks], Multipart]] = {
+    "convert": _convert,
+    "test-email": _test_email,
+    "translate-excel": _translate_excel,
+    "convert-essensgeld": _convert_essensgeld,
+    "convert-pfleger": _convert_pfleger,
+    "convert-sheets": _convert_sheets,
+    "convert-bulk": _convert_bulk,
+    "send-batch": _send_batch,
+}
+
+
+class AppServer:
+    """main.app mit uvicorn in einem Hintergrund-Thread auf einem freien Port von 127.0.0.1"""
+
+    def __init__(self, app):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self.base_url = f"http://127.0.0.1:{self._socket.getsockname()[1]}"
+        # Großes Backlog: bei hoher Parallelität sollen Anfragen warten statt abgewiesen zu werden
+        config = uvicorn.Config(app, log_level="warning", access_log=False, backlog=4096)
+        self._server = uvicorn.Server(config)
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "AppServer":
+        self._thread = threading.Thread(
+            target=self._server.run, kwargs={"sockets": [self._socket]}, name="uvicorn", daemon=True
+        )
+        self._thread.start()
+        deadline = time.monotonic() + 30
+        while not self._server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("App-Server konnte nicht gestartet werden")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=30)
+
+
+def _client() -> requests.Session:
+    session = requests.Session()
+    session.trust_env = False  # keine Proxys für 127.0.0.1
+    return session
+
+
+def _error_text(response: requests.Response) -> str:
+    try:
+        body = response.json()
+        detail = body.get("detail") if isinstance(body, dict) else body
+    except ValueError:
+        detail = response.text[:200]
+    return f"HTTP {response.status_code}: {detail}"
+
+
+def run_level(base_url: str, endpoint: str, request: Multipart, concurrency: int, n_requests: int,
+              timeout: float) -> dict:
+    """Schickt n_requests Anfragen mit concurrency gleichzeitigen Clients und wertet die Latenzen aus"""
+    data, files = request
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    remaining = [n_requests]
+
+    def client() -> None:
+        session = _client()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{base_url}/{endpoint}", data=data, files=files, timeout=timeout)
+                error = None if response.ok else _error_text(response)
+            except requests.RequestException as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if error is not None:
+                    errors[error] = errors.get(error, 0) + 1
+        session.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="client") as executor:
+        for future in [executor.submit(client) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    failed = sum(errors.values())
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": failed,
+        "error_rate": round(failed / len(latencies), 4) if latencies else 0.0,
+        "throughput_rps": round((len(latencies) - failed) / wall, 2) if wall else 0.0,
+        "latency_seconds": {
+            "p50": round(float(p50), 4),
+            "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4),
+            "max": round(max(latencies), 4) if latencies else 0.0,
+        },
+        "error_samples": dict(sorted(errors.items(), key=lambda item: -item[1])[:5]),
+        "wall_seconds": round(wall, 3),
+    }
+
+
+def _print_level(endpoint: str, level: dict) -> None:
+    latency = level["latency_seconds"]
+    print(f"{endpoint:19s} c={level['concurrency']:<3d} {level['throughput_rps']:8.2f} req/s  "
+          f"p50 {latency['p50'] * 1000:8.1f} ms  p95 {latency['p95'] * 1000:8.1f} ms  "
+          f"p99 {latency['p99'] * 1000:8.1f} ms  Fehler {level['error_rate']:6.1%}")
+    for error, count in level["error_samples"].items():
+        print(f"    {count}x {error}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(DEFAULT_ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Parallelitätsstufen, aufsteigend")
+    parser.add_argument("--requests", type=int, default=40, help="Anfragen je Stufe (mindestens eine je Client)")
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--lohnart-columns", type=int, default=20)
+    parser.add_argument("--japanese-density", type=float, default=0.3)
+    parser.add_argument("--transport", choices=("smtp", "mailgun"), default="smtp")
+    parser.add_argument("--mail-latency", type=float, default=0.0, help="Antwortzeit der Mailgun-Nachbildung in Sekunden")
+    parser.add_argument("--translator-latency", type=float, default=0.0, help="Sekunden je Übersetzungsanfrage")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout je Anfrage in Sekunden")
+    parser.add_argument("--max-error-rate", type=float, default=0.5,
+                        help="höhere Stufen eines Endpunkts überspringen, sobald die Fehlerrate darüber liegt")
+    parser.add_argument("--result-cache", action="store_true", help="Ergebnis-Cache der App aktiviert lassen")
+    parser.add_argument("--output", default="loadtest-results.json")
+    args = parser.parse_args()
+
+    endpoints = [e.strip().strip("/") for e in args.endpoints.split(",") if e.strip()]
+    unknown = [e for e in endpoints if e not in ENDPOINTS]
+    if unknown:
+        parser.error(f"Unbekannte Endpunkte: {', '.join(unknown)} (erlaubt: {', '.join(ENDPOINTS)})")
+    levels = sorted({int(c) for c in args.concurrency.split(",") if c.strip()})
+
+    workbooks = Workbooks.generate(args.rows, args.lohnart_columns, args.japanese_density)
+    translator = FakeTranslator(args.translator_latency)
+    set_translator_backend(translator)
+
+    results: Dict[str, List[dict]] = {}
+    with SmtpSink() as smtp, FakeMailgunServer(latency_seconds=args.mail_latency) as mailgun:
+        if args.transport == "smtp":
+            use_mail_stubs(smtp=smtp)
+        else:
+            use_mail_stubs(mailgun=mailgun)
+
+        with AppServer(app) as server:
+            print(f"App läuft auf {server.base_url} (CPU_WORKERS={CPU_WORKERS}, IO_WORKERS={IO_WORKERS}, "
+                  f"Versand über {args.transport})")
+            for endpoint in endpoints:
+                request = ENDPOINTS[endpoint](workbooks)
+                # Aufwärmen: Prozess-Pool starten, Verbindungen zum Mail-Dienst aufbauen
+                run_level(server.base_url, endpoint, request, 1, 1, args.timeout)
+                results[endpoint] = []
+                for concurrency in levels:
+                    level = run_level(server.base_url, endpoint, request, concurrency,
+                                      max(args.requests, concurrency), args.timeout)
+                    results[endpoint].append(level)
+                    _print_level(endpoint, level)
+                    if level["error_rate"] > args.max_error_rate:
+                        print(f"⚠️ {endpoint}: Fehlerrate über {args.max_error_rate:.0%}, höhere Stufen übersprungen")
+                        break
+        mail_stats = {"smtp": smtp.stats(), "mailgun": mailgun.stats()}
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {
+            "cpu_workers": CPU_WORKERS,
+            "io_workers": IO_WORKERS,
+            "transport": args.transport,
+            "rows": args.rows,
+            "lohnart_columns": args.lohnart_columns,
+            "japanese_density": args.japanese_density,
+            "requests_per_level": args.requests,
+            "mail_latency": args.mail_latency,
+            "translator_latency": args.translator_latency,
+            "result_cache": args.result_cache,
+            "upload_bytes": {
+                "payroll": len(workbooks.payroll),
+                "pfleger": len(workbooks.pfleger),
+                "essensgeld": len(workbooks.essensgeld),
+                "translate": len(workbooks.translate),
+            },
+        },
+        "results": results,
+        "mail": mail_stats,
+        "translator": {"requests": translator.requests, "texts": translator.texts},
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Ergebnisse gespeichert: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Benchmark-Suite: misst alle Workflows Ende-zu-Ende auf synthetischen Arbeitsmappen
+(benchmarks.workbooks) – Konvertierung bzw. Übersetzung und E-Mail-Versand. Übersetzt wird mit
+FakeTranslator, versendet über einen lokalen SMTP-Sink (benchmarks.fakes); es verlässt keine
+Anfrage den Rechner.
+
+Gemessen werden die Funktionen, die auch die Endpunkte aufrufen:
+- payroll: convert_excel_to_csv
+- pfleger: convert_pfleger_from_upload
+- essensgeld: convert_essensgeld_from_upload
+- translate: process_excel_and_translate (Übersetzungscache und Ratenbegrenzung deaktiviert)
+
+Die Ergebnisse (Median/Minimum je Phase, Zeilen, Dateigrößen, Parameter, Git-Commit) werden als
+JSON geschrieben. Mit --compare wird gegen eine frühere Ergebnisdatei verglichen: ist ein Workflow
+im Median um mehr als --tolerance langsamer, endet die Suite mit Exit-Code 1.
+
+Aufruf aus dem Projektverzeichnis:
+    python -m benchmarks.suite [--rows 1000] [--lohnart-columns 20] [--japanese-density 0.3]
+        [--workflows payroll,pfleger,essensgeld,translate] [--repeat 5] [--translator-latency 0]
+        [--output benchmark-results.json] [--compare vorher.json] [--tolerance 0.2]
+"""
+import os
+
+# Vor dem Import der Workflows: jeder Lauf übersetzt neu und ohne Wartezeit der Ratenbegrenzung
+os.environ.setdefault("TRANSLATION_CACHE_PATH", "")
+os.environ.setdefault("TRANSLATION_RATE_PER_SECOND", "0")
+
+import argparse
+import datetime
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastapi import UploadFile
+
+from benchmarks.fakes import FakeTranslator, SmtpSink, use_mail_stubs
+from benchmarks.workbooks import WORKBOOK_GENERATORS
+from workflows.email_service import close_smtp_pools, send_email
+from workflows.essensgeld_workflow import ESSENSGELD_ENGINE, convert_essensgeld_from_upload
+from workflows.excel_translate_workflow import OUTPUT_FILENAME as TRANSLATION_FILENAME, process_excel_and_translate
+from workflows.payroll_converter import PAYROLL_ENGINE, convert_excel_to_csv
+from workflows.pfleger_workflow import PFLEGER_ENGINE, convert_pfleger_from_upload
+from workflows.results import ConversionResult
+from workflows.translation import get_translator_backend, set_translator_backend
+
+MANDANT = "10001"
+RECIPIENT = "benchmark@localhost"
+
+
+def _upload(content: bytes, filename: str) -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename)
+
+
+# Workflow -> Konvertierung aus den Bytes der Arbeitsmappe (wie vom Endpunkt aufgerufen)
+WORKFLOWS: Dict[str, Callable[[bytes], ConversionResult]] = {
+    "payroll": lambda content: convert_excel_to_csv(io.BytesIO(content), MANDANT, None, "Tabelle1"),
+    "pfleger": lambda content: convert_pfleger_from_upload(_upload(content, "pfleger.xlsx"), MANDANT),
+    "essensgeld": lambda content: convert_essensgeld_from_upload(_upload(content, "essensgeld.xlsx"), MANDANT),
+    "translate": lambda content: process_excel_and_translate(_upload(content, "uebersetzung.xlsx")),
+}
+ATTACHMENT_NAMES = {"translate": TRANSLATION_FILENAME}
+
+
+def _summary(timings: List[float]) -> dict:
+    return {
+        "median": round(statistics.median(timings), 6),
+        "min": round(min(timings), 6),
+        "max": round(max(timings), 6),
+    }
+
+
+def run_workflow(workflow: str, content: bytes, repeat: int, warmup: int = 1) -> dict:
+    """Führt Konvertierung und Versand repeat-mal aus (nach warmup ungezählten Läufen)"""
+    convert = WORKFLOWS[workflow]
+    phases: Dict[str, List[float]] = {"convert": [], "email": [], "total": []}
+    result: Optional[ConversionResult] = None
+    for i in range(warmup + repeat):
+        started = time.perf_counter()
+        result = convert(content)
+        converted = time.perf_counter()
+        filename = ATTACHMENT_NAMES.get(workflow, f"lohnabrechnung_{result.abrechnungsmonat}.csv")
+        if not send_email(RECIPIENT, result.output, result.abrechnungsmonat or "", result.rows_count, filename):
+            raise RuntimeError(f"E-Mail-Versand an den SMTP-Sink fehlgeschlagen ({workflow})")
+        finished = time.perf_counter()
+        if i >= warmup:
+            phases["convert"].append(converted - started)
+            phases["email"].append(finished - converted)
+            phases["total"].append(finished - started)
+
+    convert_median = statistics.median(phases["convert"])
+    return {
+        "input_bytes": len(content),
+        "output_bytes": len(result.output),
+        "rows_count": result.rows_count,
+        "rows_per_second": round(result.rows_count / convert_median, 1) if convert_median else None,
+        "seconds": {phase: _summary(timings) for phase, timings in phases.items()},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(previous: dict, current: dict, tolerance: float) -> List[str]:
+    """Vergleicht die Mediane der Gesamtzeit; liefert die Workflows, die langsamer als erlaubt sind"""
+    if previous.get("parameters", {}).get("workload") != current["parameters"]["workload"]:
+        print("⚠️ Vergleichsdatei wurde mit anderen Größen gemessen, Vergleich nur eingeschränkt aussagekräftig")
+    regressions = []
+    for workflow, result in current["results"].items():
+        before = previous.get("results", {}).get(workflow)
+        if not before:
+            continue
+        old, new = before["seconds"]["total"]["median"], result["seconds"]["total"]["median"]
+        ratio = new / old if old else float("inf")
+        marker = "❌" if ratio > 1 + tolerance else "✅"
+        print(f"{marker} {workflow:11s} {old * 1000:9.1f} ms -> {new * 1000:9.1f} ms  ({ratio:.2f}x)")
+        if ratio > 1 + tolerance:
+            regressions.append(workflow)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--lohnart-columns", type=int, default=20,
+                        help="Lohnart-Spalten (payroll/pfleger) bzw. Spalten der Übersetzungstabelle")
+    parser.add_argument("--japanese-density", type=float, default=0.3, help="Anteil japanischer Zellen (translate)")
+    parser.add_argument("--workflows", default=",".join(WORKFLOWS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--translator-latency", type=float, default=0.0, help="Sekunden je Übersetzungsanfrage")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="frühere Ergebnisdatei für den Regressionsvergleich")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="erlaubte Verlangsamung (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    workflows = [w.strip() for w in args.workflows.split(",") if w.strip()]
+    unknown = [w for w in workflows if w not in WORKFLOWS]
+    if unknown:
+        parser.error(f"Unbekannte Workflows: {', '.join(unknown)} (erlaubt: {', '.join(WORKFLOWS)})")
+
+    translator = FakeTranslator(args.translator_latency)
+    previous_backend = get_translator_backend()
+    set_translator_backend(translator)
+    results: Dict[str, dict] = {}
+    try:
+        with SmtpSink() as sink:
+            use_mail_stubs(smtp=sink)
+            for workflow in workflows:
+                content = WORKBOOK_GENERATORS[workflow](args.rows, args.lohnart_columns, args.japanese_density, args.seed)
+                requests_before = translator.requests
+                results[workflow] = run_workflow(workflow, content, args.repeat, args.warmup)
+                if workflow == "translate":
+                    runs = args.warmup + args.repeat
+                    results[workflow]["translator_requests_per_run"] = (translator.requests - requests_before) // runs
+                seconds = results[workflow]["seconds"]
+                print(f"{workflow:11s} Konvertierung {seconds['convert']['median'] * 1000:9.1f} ms  "
+                      f"E-Mail {seconds['email']['median'] * 1000:7.1f} ms  "
+                      f"Zeilen {results[workflow]['rows_count']:7d}  ({len(content) / 1024:.0f} KiB)")
+            close_smtp_pools()
+            sink_stats = sink.stats()
+    finally:
+        set_translator_backend(previous_backend)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "workload": {
+                "rows": args.rows,
+                "lohnart_columns": args.lohnart_columns,
+                "japanese_density": args.japanese_density,
+                "seed": args.seed,
+                "translator_latency": args.translator_latency,
+            },
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "engines": {"payroll": PAYROLL_ENGINE, "pfleger": PFLEGER_ENGINE, "essensgeld": ESSENSGELD_ENGINE},
+        },
+        "results": results,
+        "smtp_sink": sink_stats,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Ergebnisse gespeichert: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        regressions = compare_results(previous, report, args.tolerance)
+        if regressions:
+            print(f"❌ Langsamer als erlaubt ({args.tolerance:.0%}): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
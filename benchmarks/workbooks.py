@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Synthetische Arbeitsmappen für Benchmarks und Lasttests, je Workflow im Layout der echten Exporte:
+
+- payroll_workbook: Lohnjournal mit Titelzeilen (Abrechnungsdatum in Zeile 2), Spaltenköpfen in
+  Zeile 5 und je Lohnart einer Gruppe "Lohnart" + "Betrag"/"Stunden"
+- pfleger_workbook: Pflegeheim-Export mit Lohnart-Codes in Zeile 2 ab Spalte E
+- essensgeld_workbook: Essensgeld-Liste mit Kopfzeile (Personalnummer, Name, Summe Essensgeld PK)
+- translate_workbook: Tabelle mit Zahlen, deutschen und japanischen Texten (Anteil einstellbar)
+
+Alle Generatoren sind deterministisch (seed) und liefern die .xlsx-Datei als Bytes.
+"""
+import datetime
+import io
+import random
+from typing import Callable, Dict, List
+
+import openpyxl
+
+JAPANESE_WORDS = ["社員番号", "氏名", "基本給", "残業手当", "交通費", "ﾊﾟｰﾄ", "東京本社", "大阪支店", "合計", "夜勤手当", "賞与"]
+GERMAN_WORDS = ["Müller", "Straße", "Gesamt", "Lohnart", "Stunden", "Bemerkung", "Zuschlag", "Pflege"]
+
+
+def _save(wb: openpyxl.Workbook) -> bytes:
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _new_sheet(wb: openpyxl.Workbook, title: str = "Tabelle1"):
+    return wb.create_sheet(title=title)
+
+
+def _amount(rng: random.Random) -> float:
+    return round(rng.lognormvariate(5, 1.5), 2)
+
+
+def payroll_workbook(rows: int = 1000, lohnart_columns: int = 20, seed: int = 42,
+                     abrechnungsdatum: datetime.datetime = datetime.datetime(2024, 8, 31)) -> bytes:
+    """Lohnjournal: rows Mitarbeiter, lohnart_columns Lohnart-Gruppen (Code + Betrag bzw. Stunden)"""
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = _new_sheet(wb)
+    n_cols = 2 + 2 * lohnart_columns
+
+    ws.append(["Lohnjournal"])
+    ws.append([None, None, abrechnungsdatum])
+    ws.append([])
+    ws.append([f"Spalte {c + 1}" for c in range(n_cols)])
+    units = [rng.choice(["Betrag", "Betrag", "Euro", "Stunden", "Urlaubstage"]) for _ in range(lohnart_columns)]
+    header = ["Personalnummer", "Kostenstelle"]
+    for unit in units:
+        header += ["Lohnart", unit]
+    ws.append(header)
+
+    codes = [1000 + 10 * k for k in range(lohnart_columns)]
+    for r in range(rows):
+        row: List = [10000 + r, rng.choice(["KST 100", "KST 200", 4711, None])]
+        for code, unit in zip(codes, units):
+            if rng.random() < 0.35:
+                row += [None, None]
+            elif unit in ("Stunden", "Urlaubstage"):
+                row += [code, round(rng.uniform(0, 180), 1)]
+            else:
+                row += [code, _amount(rng)]
+        ws.append(row)
+    return _save(wb)
+
+
+def pfleger_workbook(rows: int = 1000, lohnart_columns: int = 20, seed: int = 42) -> bytes:
+    """Pflegeheim-Export: Lohnart-Codes in Zeile 2 ab Spalte E, danach eine Zeile je Mitarbeiter"""
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = _new_sheet(wb)
+
+    ws.append(["Pflegeheim Export"])
+    codes = [rng.choice([f"LA {1000 + c}", 2000 + c, f"{c}0 Zuschlag"]) for c in range(lohnart_columns)]
+    ws.append([None, None, None, None] + codes)
+    for r in range(rows):
+        row: List = [100 + r, rng.choice(GERMAN_WORDS), None, rng.choice(["KST 5", 4711, None])]
+        for c in range(lohnart_columns):
+            kind = rng.random()
+            if kind < 0.5:
+                row.append(None)
+            elif c < 2:
+                row.append(round(rng.uniform(0, 180), 1))
+            elif kind < 0.9:
+                row.append(_amount(rng))
+            else:
+                row.append(f"{rng.randint(1, 99)},{rng.randint(0, 9)}")
+        ws.append(row)
+    return _save(wb)
+
+
+def essensgeld_workbook(rows: int = 1000, seed: int = 42) -> bytes:
+    """Essensgeld-Liste: eine Zeile je Mitarbeiter, etwa jeder fünfte ohne Essensgeld"""
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = _new_sheet(wb)
+
+    ws.append(["Personalnummer", "Name", "Summe Essensgeld PK", "Bemerkung"])
+    for r in range(rows):
+        betrag = rng.choice([0, None]) if rng.random() < 0.2 else round(rng.uniform(1, 120), 2)
+        ws.append([100 + r, rng.choice(GERMAN_WORDS), betrag, None])
+    return _save(wb)
+
+
+def translate_workbook(rows: int = 1000, columns: int = 10, japanese_density: float = 0.3,
+                       seed: int = 42) -> bytes:
+    """
+    Tabelle mit Kopfzeile und rows Datenzeilen: Zahlen, Datumswerte und Texte; japanische Texte
+    machen japanese_density (0-1) aller Zellen aus und wiederholen sich wie Bezeichnungen in Exporten.
+    """
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = _new_sheet(wb)
+
+    ws.append([rng.choice(JAPANESE_WORDS) if rng.random() < japanese_density else f"Spalte {c + 1}"
+               for c in range(columns)])
+    for r in range(rows):
+        row: List = []
+        for _ in range(columns):
+            if rng.random() < japanese_density:
+                row.append(f"{rng.choice(JAPANESE_WORDS)}{rng.randint(1, 50)}")
+                continue
+            kind = rng.random()
+            if kind < 0.5:
+                row.append(_amount(rng))
+            elif kind < 0.6:
+                row.append(datetime.datetime(2024, 1, 1) + datetime.timedelta(days=r % 365))
+            elif kind < 0.85:
+                row.append(rng.choice(GERMAN_WORDS))
+            else:
+                row.append(None)
+        ws.append(row)
+    return _save(wb)
+
+
+# Workflow -> Generator(rows, lohnart_columns, japanese_density, seed)
+WORKBOOK_GENERATORS: Dict[str, Callable[[int, int, float, int], bytes]] = {
+    "payroll": lambda rows, cols, density, seed: payroll_workbook(rows, cols, seed),
+    "pfleger": lambda rows, cols, density, seed: pfleger_workbook(rows, cols, seed),
+    "essensgeld": lambda rows, cols, density, seed: essensgeld_workbook(rows, seed),
+    "translate": lambda rows, cols, density, seed: translate_workbook(rows, cols, density, seed),
+}
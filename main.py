@@ -1,19 +1,45 @@
 #!/usr/bin/env python3
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
-from workflows.payroll_workflow import process_payroll_conversion
-from workflows.email_service import send_simple_email, send_email
-from workflows.excel_translate_workflow import process_excel_and_translate
-from workflows.essensgeld_workflow import convert_essensgeld_from_upload
-from workflows.pfleger_workflow import convert_pfleger_from_upload
-from fastapi.responses import FileResponse
+from typing import List, Optional
+from workflows.payroll_workflow import process_payroll_conversion, read_payroll_upload, run_payroll_conversion
+from workflows.email_service import (
+    EmailJob, close_mailgun_session, close_smtp_pools, get_transport_registry, init_transport_registry,
+    send_email_batch, send_simple_email
+)
+from workflows.excel_translate_workflow import run_excel_translation
+from workflows.essensgeld_workflow import run_essensgeld_conversion
+from workflows.pfleger_workflow import run_pfleger_conversion
+from workflows.multi_sheet import parse_sheet_list, run_multi_sheet_conversion, validate_multi_sheet_request
+from workflows.bulk_workflow import (
+    build_bulk_archive, bulk_report, convert_bulk, parse_manifest, read_bulk_uploads, send_bulk_results
+)
+from workflows.executor import executor_stats, run_io, shutdown_executors
+from workflows.jobs import Job, job_queue
+from workflows.metrics import METRICS_ENABLED, ServerTimingMiddleware, render_metrics
+from workflows.result_cache import result_cache_stats
+from workflows.translation_cache import close_translation_cache, translation_cache_stats
+from workflows.uploads import read_upload
+from fastapi.responses import JSONResponse, Response
+import mimetypes
 import os
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # E-Mail-Konfiguration einmal beim Start lesen
+    init_transport_registry()
+    yield
+    shutdown_executors()
+    close_smtp_pools()
+    close_mailgun_session()
+    close_translation_cache()
+
 app = FastAPI(
     title="Lohnabrechnung Konverter",
     description="API für Excel zu CSV Konvertierung mit E-Mail-Versand",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -23,8 +49,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Server-Timing im Browser auch für Anfragen anderer Origins lesbar
+    expose_headers=["Server-Timing"],
 )
 
+# Dauer der Verarbeitungsschritte jeder Anfrage als Server-Timing-Header
+if METRICS_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
 @app.get("/")
 async def root():
     """API Info"""
@@ -33,8 +65,14 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "convert": "/convert",
+            "convert_bulk": "/convert-bulk",
+            "convert_sheets": "/convert-sheets",
             "test_email": "/test-email",
+            "send_batch": "/send-batch",
             "health": "/health",
+            "stats": "/stats",
+            "metrics": "/metrics",
+            "jobs": "/jobs/{job_id}",
             "docs": "/docs"
         },
         "status": "ready"
@@ -42,8 +80,39 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health Check für Monitoring"""
-    return {"status": "healthy", "service": "lohnabrechnung-konverter"}
+    """Health Check für Monitoring (ohne Cache-Statistiken, die stehen unter /stats)"""
+    return {
+        "status": "healthy",
+        "service": "lohnabrechnung-konverter",
+        "executors": executor_stats(),
+        "email_transports": get_transport_registry().stats(),
+        "jobs": job_queue.stats()
+    }
+
+@app.get("/stats")
+async def cache_stats():
+    """Trefferquoten und Größe der Caches"""
+    return {
+        "result_cache": await run_io(result_cache_stats),
+        "translation_cache": await run_io(translation_cache_stats)
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Dauer, Bytes und Zeilen je Verarbeitungsschritt im Prometheus-Textformat"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metriken deaktiviert (METRICS_ENABLED=0)")
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def job_accepted(job: Job) -> JSONResponse:
+    """Antwort für im Hintergrund angenommene Uploads"""
+    return JSONResponse(status_code=202, content={
+        "message": "Upload angenommen, Verarbeitung läuft im Hintergrund",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result"
+    })
 
 @app.post("/convert")
 async def convert_payroll(
@@ -51,10 +120,21 @@ async def convert_payroll(
     email: str = Form(..., description="E-Mail-Adresse"),
     mandant: str = Form("10001", description="Mandant"),
     abrechnungsmonat: Optional[str] = Form(None, description="Abrechnungsmonat YYYYMM"),
-    sheet_name: str = Form("Tabelle1", description="Arbeitsblatt")
+    sheet_name: str = Form("Tabelle1", description="Arbeitsblatt"),
+    async_job: bool = Form(False, description="Im Hintergrund verarbeiten und Job-ID zurückgeben")
 ):
     """Excel zu CSV konvertieren und per E-Mail senden"""
-    return await process_payroll_conversion(file, email, mandant, abrechnungsmonat, sheet_name)
+    if not async_job:
+        return await process_payroll_conversion(file, email, mandant, abrechnungsmonat, sheet_name)
+
+    upload = await read_payroll_upload(file, email)
+    job = job_queue.submit(
+        "payroll",
+        lambda job: run_payroll_conversion(
+            upload.content, email, mandant, abrechnungsmonat, sheet_name, job=job, content_hash=upload.sha256
+        )
+    )
+    return job_accepted(job)
 
 @app.post("/test-email")
 async def test_email(
@@ -62,7 +142,8 @@ async def test_email(
 ):
     """E-Mail-Konfiguration testen"""
     try:
-        success = send_simple_email(
+        success = await run_io(
+            send_simple_email,
             recipient_email=email,
             subject="Test E-Mail - Lohnabrechnung Service",
             body="Dies ist eine Test-E-Mail. Wenn Sie diese erhalten, funktioniert die E-Mail-Konfiguration."
@@ -82,22 +163,22 @@ async def test_email(
 @app.post("/translate-excel")
 async def translate_excel(
     file: UploadFile = File(..., description="Excel-Datei mit japanischem Text"),
-    email: str = Form(..., description="E-Mail-Adresse")
+    email: str = Form(..., description="E-Mail-Adresse"),
+    async_job: bool = Form(False, description="Im Hintergrund verarbeiten und Job-ID zurückgeben"),
+    preserve_formatting: bool = Form(
+        True, description="Formatierung erhalten; false = nur Werte, speichersparend gestreamt (für sehr große Dateien)"
+    )
 ):
     """Excel-Datei hochladen, japanische Texte nach Deutsch übersetzen und per E-Mail senden."""
+    # Übersetzung arbeitet mit openpyxl, daher nur .xlsx
+    upload = await read_upload(file, formats=("xlsx",))
     try:
-        output_path = process_excel_and_translate(file)
-        # Zeilen zählen (ohne Header)
-        import openpyxl
-        wb = openpyxl.load_workbook(output_path)
-        ws = wb.active
-        rows_count = ws.max_row - 1 if ws.max_row > 1 else 0
-        # Abrechnungsmonat ist hier nicht relevant, aber Pflicht für send_email
-        success = send_email(email, output_path, "", rows_count)
-        if success:
-            return {"message": f"Übersetzte Excel-Datei erfolgreich an {email} gesendet."}
-        else:
-            raise HTTPException(status_code=500, detail="E-Mail-Versand fehlgeschlagen.")
+        if async_job:
+            return job_accepted(job_queue.submit(
+                "translate",
+                lambda job: run_excel_translation(upload.content, email, job=job, preserve_formatting=preserve_formatting)
+            ))
+        return await run_excel_translation(upload.content, email, preserve_formatting=preserve_formatting)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Fehler bei der Übersetzung: {str(e)}")
 
@@ -106,17 +187,20 @@ async def convert_essensgeld(
     file: UploadFile = File(..., description="Essensgeld Excel-Datei"),
     email: str = Form(..., description="E-Mail-Adresse"),
     mandant: str = Form("10001", description="Mandant"),
-    abrechnungsmonat: str = Form(None, description="Abrechnungsmonat YYYYMM")
+    abrechnungsmonat: str = Form(None, description="Abrechnungsmonat YYYYMM"),
+    async_job: bool = Form(False, description="Im Hintergrund verarbeiten und Job-ID zurückgeben")
 ):
     """Essensgeld-Excel konvertieren und per E-Mail senden."""
+    upload = await read_upload(file)
     try:
-        output_path = convert_essensgeld_from_upload(file, mandant, abrechnungsmonat)
-        rows_count = sum(1 for _ in open(output_path, encoding="utf-8")) - 1  # Zeilen ohne Header
-        success = send_email(email, output_path, abrechnungsmonat or "", rows_count)
-        if success:
-            return {"message": f"Essensgeld erfolgreich an {email} gesendet."}
-        else:
-            raise HTTPException(status_code=500, detail="E-Mail-Versand fehlgeschlagen.")
+        if async_job:
+            return job_accepted(job_queue.submit(
+                "essensgeld",
+                lambda job: run_essensgeld_conversion(
+                    upload.content, email, mandant, abrechnungsmonat, job=job, content_hash=upload.sha256
+                )
+            ))
+        return await run_essensgeld_conversion(upload.content, email, mandant, abrechnungsmonat, content_hash=upload.sha256)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Fehler bei der Essensgeld-Konvertierung: {str(e)}")
 
@@ -125,25 +209,158 @@ async def convert_pfleger(
     file: UploadFile = File(..., description="Pflegeheim Excel-Datei"),
     email: str = Form(..., description="E-Mail-Adresse"),
     mandant: str = Form("10001", description="Mandant"),
-    abrechnungsmonat: str = Form(None, description="Abrechnungsmonat YYYYMM")
+    abrechnungsmonat: str = Form(None, description="Abrechnungsmonat YYYYMM"),
+    async_job: bool = Form(False, description="Im Hintergrund verarbeiten und Job-ID zurückgeben")
 ):
     """Pflegeheim-Excel konvertieren und per E-Mail senden."""
+    upload = await read_upload(file)
     try:
-        output_path = convert_pfleger_from_upload(file, mandant, abrechnungsmonat)
-        rows_count = sum(1 for _ in open(output_path, encoding="utf-8")) - 1
-        success = send_email(email, output_path, abrechnungsmonat or "", rows_count)
-        if success:
-            return {"message": f"Pflegeheim-Datei erfolgreich an {email} gesendet."}
-        else:
-            raise HTTPException(status_code=500, detail="E-Mail-Versand fehlgeschlagen.")
+        if async_job:
+            return job_accepted(job_queue.submit(
+                "pfleger",
+                lambda job: run_pfleger_conversion(
+                    upload.content, email, mandant, abrechnungsmonat, job=job, content_hash=upload.sha256
+                )
+            ))
+        return await run_pfleger_conversion(upload.content, email, mandant, abrechnungsmonat, content_hash=upload.sha256)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Fehler bei der Pflegeheim-Konvertierung: {str(e)}")
 
-@app.get("/download/{filename}")
-async def download_translated_excel(filename: str):
-    """Download einer übersetzten Excel-Datei aus dem temporären Verzeichnis."""
-    temp_dir = "/tmp"  # Standard für NamedTemporaryFile
-    file_path = os.path.join(temp_dir, filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Datei nicht gefunden")
-    return FileResponse(file_path, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", filename=filename)
+@app.post("/convert-bulk")
+async def convert_bulk_files(
+    files: List[UploadFile] = File(..., description="Excel-Dateien und/oder ZIP-Archive mit Excel-Dateien"),
+    manifest: Optional[str] = Form(None, description='JSON {Dateiname: {"workflow", "mandant", "abrechnungsmonat", "sheet_name", "email"}}'),
+    workflow: str = Form("payroll", description="Standard-Workflow: payroll, pfleger oder essensgeld"),
+    mandant: str = Form("10001", description="Standard-Mandant"),
+    abrechnungsmonat: Optional[str] = Form(None, description="Standard-Abrechnungsmonat YYYYMM"),
+    sheet_name: str = Form("Tabelle1", description="Standard-Arbeitsblatt (payroll)"),
+    email: Optional[str] = Form(None, description="Standard-Empfänger"),
+    delivery: str = Form("archive", description="archive: ZIP mit allen CSV-Dateien, email: eine E-Mail je Empfänger")
+):
+    """Mehrere Dateien parallel konvertieren; Fehler einzelner Dateien werden im Bericht gemeldet."""
+    if delivery not in ("archive", "email"):
+        raise HTTPException(status_code=400, detail="delivery muss 'archive' oder 'email' sein")
+    defaults = {
+        "workflow": workflow,
+        "mandant": mandant,
+        "abrechnungsmonat": abrechnungsmonat,
+        "sheet_name": sheet_name,
+        "email": email
+    }
+    items = await read_bulk_uploads(files, parse_manifest(manifest), defaults)
+    results = await convert_bulk(items)
+
+    if delivery == "email":
+        deliveries = await send_bulk_results(results)
+        return {**bulk_report(results), "emails": deliveries}
+
+    report = bulk_report(results)
+    return Response(
+        content=await run_io(build_bulk_archive, results),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": 'attachment; filename="lohnabrechnungen.zip"',
+            "X-Bulk-Succeeded": str(report["succeeded"]),
+            "X-Bulk-Failed": str(report["failed"])
+        }
+    )
+
+@app.post("/convert-sheets")
+async def convert_sheets(
+    file: UploadFile = File(..., description="Excel-Datei mit mehreren Arbeitsblättern"),
+    email: str = Form(..., description="E-Mail-Adresse"),
+    workflow: str = Form("payroll", description="payroll, pfleger oder essensgeld"),
+    mandant: str = Form("10001", description="Mandant"),
+    abrechnungsmonat: Optional[str] = Form(None, description="Abrechnungsmonat YYYYMM"),
+    sheets: Optional[str] = Form(None, description="Kommagetrennte Arbeitsblätter (leer = alle passenden)"),
+    sheet_pattern: Optional[str] = Form(None, description="Muster für Arbeitsblätter, z.B. 'Abt*' (Standard: alle)"),
+    output: str = Form("combined", description="combined: eine CSV, per_sheet: ZIP mit einer CSV je Blatt"),
+    async_job: bool = Form(False, description="Im Hintergrund verarbeiten und Job-ID zurückgeben")
+):
+    """Mehrere Arbeitsblätter aus einem Upload in einem Durchgang konvertieren und per E-Mail senden."""
+    validate_multi_sheet_request(workflow, output)
+    upload = await read_upload(file)
+    sheet_list = parse_sheet_list(sheets)
+    if async_job:
+        return job_accepted(job_queue.submit(
+            "sheets",
+            lambda job: run_multi_sheet_conversion(
+                upload.content, email, workflow, mandant, abrechnungsmonat, sheet_list, sheet_pattern, output,
+                job=job, content_hash=upload.sha256
+            )
+        ))
+    try:
+        return await run_multi_sheet_conversion(
+            upload.content, email, workflow, mandant, abrechnungsmonat, sheet_list, sheet_pattern, output,
+            content_hash=upload.sha256
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Fehler bei der Mehrblatt-Konvertierung: {str(e)}")
+
+@app.post("/send-batch")
+async def send_batch(
+    files: List[UploadFile] = File(..., description="Konvertierte Dateien (eine je Nachricht)"),
+    emails: List[str] = Form(..., description="Empfänger je Datei (gleiche Reihenfolge wie files)"),
+    abrechnungsmonate: List[str] = Form(..., description="Abrechnungsmonat je Datei oder einer für alle")
+):
+    """Mehrere konvertierte Dateien in einem Batch versenden (Verbindungen werden wiederverwendet)."""
+    if len(emails) != len(files):
+        raise HTTPException(status_code=400, detail="Anzahl E-Mail-Adressen muss der Anzahl Dateien entsprechen")
+    if len(abrechnungsmonate) == 1:
+        abrechnungsmonate = abrechnungsmonate * len(files)
+    if len(abrechnungsmonate) != len(files):
+        raise HTTPException(status_code=400, detail="Anzahl Abrechnungsmonate muss der Anzahl Dateien entsprechen")
+
+    jobs = []
+    for upload, email, monat in zip(files, emails, abrechnungsmonate):
+        # Konvertierte Dateien (CSV/TXT oder übersetzte Excel-Dateien): nur Größenlimit, keine Signaturprüfung
+        content = (await read_upload(upload, formats=None)).content
+        # Zeilen ohne Header, nur bei Textdateien aussagekräftig
+        if os.path.splitext(upload.filename or "")[1].lower() in (".csv", ".txt"):
+            rows_count = max(content.count(b"\n") - 1, 0)
+        else:
+            rows_count = 0
+        jobs.append(EmailJob(email, content, monat, rows_count, attachment_name=os.path.basename(upload.filename or "") or None))
+
+    results = await run_io(send_email_batch, jobs)
+    return {
+        "sent": sum(1 for r in results if r.success),
+        "failed": sum(1 for r in results if not r.success),
+        "results": [
+            {
+                "email": r.recipient_email,
+                "filename": upload.filename,
+                "success": r.success,
+                "transport": r.transport,
+                "error": r.error
+            }
+            for r, upload in zip(results, files)
+        ]
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Status und Fortschritt eines Hintergrund-Jobs"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Download der Ausgabedatei eines abgeschlossenen Jobs"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=f"Job fehlgeschlagen: {job.error}")
+    # Auch nach fehlgeschlagenem E-Mail-Versand (Status "converted") abrufbar
+    if not job.downloadable:
+        raise HTTPException(status_code=409, detail=f"Job noch nicht abgeschlossen (Status: {job.status})")
+    return Response(
+        content=job.output,
+        media_type=mimetypes.guess_type(job.output_filename)[0] or "application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{job.output_filename}"'}
+    )
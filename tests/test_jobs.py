@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Regressionstests: Hintergrund-Jobs bleiben nach fehlgeschlagenem E-Mail-Versand abrufbar
+"""
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.workbooks import pfleger_workbook
+from workflows import executor, pfleger_workflow, result_cache
+
+
+def _wait_for_job(client: TestClient, job_id: str, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} nicht rechtzeitig abgeschlossen")
+
+
+def test_result_downloadable_when_email_fails(monkeypatch):
+    # Konvertierung im Thread-Pool und ohne Ergebnis-Cache; der Versand scheitert immer
+    monkeypatch.setattr(executor, "cpu_executor", executor.io_executor)
+    monkeypatch.setattr(result_cache, "result_cache", None)
+    monkeypatch.setattr(pfleger_workflow, "send_email", lambda *args, **kwargs: False)
+
+    with TestClient(main.app) as client:
+        response = client.post(
+            "/convert-pfleger",
+            files={"file": ("pfleger.xlsx", pfleger_workbook(rows=20), "application/octet-stream")},
+            data={"email": "lohn@example.com", "abrechnungsmonat": "202408", "async_job": "true"},
+        )
+        assert response.status_code == 202
+        job = _wait_for_job(client, response.json()["job_id"])
+
+        assert job["status"] == "converted"
+        assert job["email_error"] == "E-Mail-Versand fehlgeschlagen."
+        assert job["progress"] == {"received": True, "converted": True, "emailed": False}
+        assert job["result_url"] == f"/jobs/{job['job_id']}/result"
+
+        result = client.get(job["result_url"])
+        assert result.status_code == 200
+        assert result.content
+        assert "lohnabrechnung_202408.csv" in result.headers["content-disposition"]
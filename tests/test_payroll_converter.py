@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Regressionstests: die spaltenweise Engine liefert dieselbe CSV wie die zeilenweise Referenz-Implementierung
+"""
+import datetime
+import io
+import os
+
+import openpyxl
+
+from benchmarks.workbooks import payroll_workbook
+from workflows.payroll_converter import convert_excel_to_csv
+
+
+def _workbook(rows) -> bytes:
+    """Lohnjournal mit Titelzeilen, Spaltenköpfen in Zeile 5 und den angegebenen Datenzeilen"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Tabelle1"
+    ws.append(["Lohnjournal"])
+    ws.append([None, None, datetime.datetime(2024, 8, 31)])
+    ws.append([])
+    ws.append(["Spalte 1", "Spalte 2", "Spalte 3", "Spalte 4", "Spalte 5", "Spalte 6"])
+    ws.append(["Personalnummer", "Kostenstelle", "Lohnart", "Betrag", "Lohnart", "Stunden"])
+    for row in rows:
+        ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _convert_both(content: bytes):
+    return [
+        convert_excel_to_csv(io.BytesIO(content), "10001", None, "Tabelle1", engine=engine).output
+        for engine in ("legacy", "vectorized")
+    ]
+
+
+def test_integer_kostenstelle_with_blank_cells_is_identical():
+    content = _workbook([
+        [100, 4711, 1000, 1234.5, 2000, 7.5],
+        [101, None, 1000, 99, None, None],
+        [102, 4712, 1010, 10, 2000, 8],
+    ])
+    legacy, vectorized = _convert_both(content)
+    assert vectorized == legacy
+    assert f";4711{os.linesep}".encode() in legacy
+    assert b"4711.0" not in vectorized
+
+
+def test_synthetic_workbook_is_identical():
+    legacy, vectorized = _convert_both(payroll_workbook(rows=300, lohnart_columns=8, seed=7))
+    assert vectorized == legacy
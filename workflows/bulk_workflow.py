@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Sammelkonvertierung: mehrere Excel-Dateien (einzeln hochgeladen oder als ZIP-Archiv) werden
+in einem Request konvertiert. Jede Datei wird über ein Manifest einem Workflow (payroll,
+pfleger, essensgeld), einem Mandanten und optional einem Empfänger zugeordnet; die
+Konvertierungen laufen parallel im Prozess-Pool (über den Ergebnis-Cache).
+
+Fehler einer Datei (falscher Dateityp, defekte Arbeitsmappe, fehlendes Arbeitsblatt) werden
+pro Datei gemeldet und brechen den Batch nicht ab.
+
+Konfiguration über Umgebungsvariablen:
+- BULK_MAX_FILES: maximale Anzahl Dateien pro Request inkl. ZIP-Inhalt (Standard 100)
+- BULK_MAX_BYTES: maximale Größe eines hochgeladenen ZIP-Archivs (Standard 100 MB)
+- BULK_MAX_UNCOMPRESSED_BYTES: maximale Gesamtgröße aller Dateien eines Requests nach dem Entpacken
+  (Standard 200 MB)
+
+Anzahl und entpackte Größe der ZIP-Einträge werden vor dem Entpacken anhand des Inhaltsverzeichnisses
+geprüft (zipfile liest nie mehr als die dort angegebene Größe); beim ersten überschrittenen Limit wird
+der Request abgelehnt.
+"""
+import asyncio
+import io
+import json
+import os
+import time
+import zipfile
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+from workflows.email_service import EmailJob, send_email_batch
+from workflows.essensgeld_workflow import convert_essensgeld_content
+from workflows.executor import run_io
+from workflows.payroll_workflow import convert_payroll_content
+from workflows.pfleger_workflow import convert_pfleger_content
+from workflows.result_cache import convert_cached
+from workflows.results import ConversionResult
+from workflows.uploads import EXCEL_FORMATS, FILE_SIGNATURES, UPLOAD_MAX_BYTES, detect_file_format, read_upload
+
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "100"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(100 * 1024 * 1024)))
+BULK_MAX_UNCOMPRESSED_BYTES = int(os.getenv("BULK_MAX_UNCOMPRESSED_BYTES", str(200 * 1024 * 1024)))
+
+# Workflow -> (Konvertierung, Parameter der Konvertierung außer dem Inhalt)
+WORKFLOW_CONVERTERS: Dict[str, Tuple[Callable[..., ConversionResult], Tuple[str, ...]]] = {
+    "payroll": (convert_payroll_content, ("mandant", "abrechnungsmonat", "sheet_name")),
+    "pfleger": (convert_pfleger_content, ("mandant", "abrechnungsmonat")),
+    "essensgeld": (convert_essensgeld_content, ("mandant", "abrechnungsmonat")),
+}
+
+
+@dataclass
+class BulkItem:
+    """Eine Datei des Batches mit ihrer Zuordnung (Workflow, Mandant, Empfänger)"""
+    filename: str
+    content: bytes
+    workflow: str = "payroll"
+    mandant: str = "10001"
+    abrechnungsmonat: Optional[str] = None
+    sheet_name: str = "Tabelle1"
+    email: Optional[str] = None
+    error: Optional[str] = None  # bereits beim Einlesen fehlgeschlagen
+
+
+@dataclass
+class BulkItemResult:
+    filename: str
+    workflow: str
+    mandant: str
+    success: bool
+    email: Optional[str] = None
+    rows_count: int = 0
+    abrechnungsmonat: Optional[str] = None
+    duration_seconds: float = 0.0
+    cached: bool = False
+    error: Optional[str] = None
+    output_filename: Optional[str] = None
+    output: Optional[bytes] = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("output")
+        data["duration_seconds"] = round(self.duration_seconds, 3)
+        return data
+
+
+def parse_manifest(manifest: Optional[str]) -> Dict[str, dict]:
+    """
+    Manifest als JSON-Objekt {Dateiname: {"workflow", "mandant", "abrechnungsmonat", "sheet_name", "email"}}.
+    Nicht angegebene Werte werden aus den Standardwerten des Requests übernommen.
+    """
+    if not manifest:
+        return {}
+    try:
+        data = json.loads(manifest)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Manifest ist kein gültiges JSON: {str(e)}")
+    if not isinstance(data, dict) or not all(isinstance(v, dict) for v in data.values()):
+        raise HTTPException(status_code=400, detail="Manifest muss ein Objekt {Dateiname: {...}} sein")
+    return data
+
+
+def _is_zip_upload(file: UploadFile) -> bool:
+    return (file.filename or "").lower().endswith(".zip")
+
+
+def _too_many_files() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Zu viele Dateien (maximal {BULK_MAX_FILES})")
+
+
+def _too_large_in_total() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Dateien insgesamt zu groß (maximal {round(BULK_MAX_UNCOMPRESSED_BYTES / (1024 * 1024), 1):g} MB entpackt)"
+    )
+
+
+def _extract_zip(archive: bytes, archive_name: str, max_files: int = BULK_MAX_FILES,
+                 max_bytes: int = BULK_MAX_UNCOMPRESSED_BYTES) -> List[Tuple[str, bytes, Optional[str]]]:
+    """
+    Liest die Excel-Dateien eines ZIP-Archivs. Liefert (Dateiname, Inhalt, Fehler) je Eintrag;
+    zu große oder defekte Einträge werden als Fehler gemeldet statt gelesen. Enthält das Archiv
+    mehr als max_files Excel-Dateien oder mehr als max_bytes entpackt, wird es vor dem Entpacken
+    abgelehnt (Schutz vor ZIP-Bomben).
+    """
+    try:
+        zf = zipfile.ZipFile(io.BytesIO(archive))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail=f"{archive_name}: kein gültiges ZIP-Archiv")
+
+    entries = []
+    with zf:
+        # Erst das Inhaltsverzeichnis prüfen, dann entpacken
+        selected = []
+        total_bytes = 0
+        for info in zf.infolist():
+            name = info.filename
+            basename = os.path.basename(name)
+            # Verzeichnisse, macOS-Metadaten und versteckte Dateien überspringen
+            if info.is_dir() or name.startswith("__MACOSX/") or basename.startswith("."):
+                continue
+            if not basename.lower().endswith((".xlsx", ".xls")):
+                continue
+            selected.append(info)
+            if len(selected) > max_files:
+                raise _too_many_files()
+            if info.file_size <= UPLOAD_MAX_BYTES:
+                total_bytes += info.file_size
+                if total_bytes > max_bytes:
+                    raise _too_large_in_total()
+
+        for info in selected:
+            name = info.filename
+            # Zu große Einzeldateien werden gemeldet, nicht entpackt
+            if info.file_size > UPLOAD_MAX_BYTES:
+                entries.append((name, b"", f"Datei zu groß (maximal {round(UPLOAD_MAX_BYTES / (1024 * 1024), 1):g} MB)"))
+                continue
+            try:
+                entries.append((name, zf.read(info), None))
+            except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, RuntimeError) as e:
+                entries.append((name, b"", f"Eintrag nicht lesbar: {str(e)}"))
+    return entries
+
+
+async def read_bulk_uploads(files: List[UploadFile], manifest: Dict[str, dict], defaults: dict) -> List[BulkItem]:
+    """
+    Liest alle Uploads (ZIP-Archive werden entpackt) und ordnet jede Datei über das Manifest
+    (voller Pfad im Archiv oder Dateiname) einem Workflow und Mandanten zu.
+    """
+    raw: List[Tuple[str, bytes, Optional[str]]] = []
+    total_bytes = 0
+    for file in files:
+        if _is_zip_upload(file):
+            # ZIP hat dieselbe Signatur wie .xlsx
+            upload = await read_upload(file, formats=("xlsx",), max_bytes=BULK_MAX_BYTES)
+            # Das Archiv darf nur noch die restlichen Dateien und Bytes des Requests enthalten
+            extracted = await run_io(
+                _extract_zip, upload.content, file.filename,
+                BULK_MAX_FILES - len(raw), BULK_MAX_UNCOMPRESSED_BYTES - total_bytes
+            )
+            raw.extend(extracted)
+            total_bytes += sum(len(content) for _, content, _ in extracted)
+            continue
+        try:
+            upload = await read_upload(file)
+            raw.append((file.filename or "upload.xlsx", upload.content, None))
+            total_bytes += len(upload.content)
+        except HTTPException as e:
+            # Ungültige Einzeldatei: im Bericht melden, Rest des Batches weiter verarbeiten
+            raw.append((file.filename or "upload.xlsx", b"", e.detail))
+        if len(raw) > BULK_MAX_FILES:
+            raise _too_many_files()
+        if total_bytes > BULK_MAX_UNCOMPRESSED_BYTES:
+            raise _too_large_in_total()
+
+    if not raw:
+        raise HTTPException(status_code=400, detail="Keine Excel-Dateien im Upload gefunden")
+
+    items = []
+    for filename, content, error in raw:
+        settings = {**defaults, **manifest.get(filename, manifest.get(os.path.basename(filename), {}))}
+        item = BulkItem(
+            filename=filename,
+            content=content,
+            workflow=str(settings.get("workflow") or "payroll"),
+            mandant=str(settings.get("mandant") or "10001"),
+            abrechnungsmonat=str(settings["abrechnungsmonat"]) if settings.get("abrechnungsmonat") else None,
+            sheet_name=settings.get("sheet_name") or "Tabelle1",
+            email=settings.get("email") or None,
+            error=error,
+        )
+        if item.error is None and item.workflow not in WORKFLOW_CONVERTERS:
+            item.error = f"Unbekannter Workflow '{item.workflow}' (erlaubt: {', '.join(WORKFLOW_CONVERTERS)})"
+        if item.error is None and detect_file_format(content[:len(FILE_SIGNATURES["xls"])], EXCEL_FORMATS) is None:
+            item.error = "Ungültiger Dateityp, erlaubt: .xlsx, .xls"
+        items.append(item)
+    return items
+
+
+async def convert_bulk_item(item: BulkItem) -> BulkItemResult:
+    """Konvertiert eine Datei des Batches; Fehler werden im Ergebnis statt als Exception gemeldet"""
+    result = BulkItemResult(item.filename, item.workflow, item.mandant, success=False, email=item.email,
+                            abrechnungsmonat=item.abrechnungsmonat)
+    if item.error is not None:
+        result.error = item.error
+        return result
+
+    convert, param_names = WORKFLOW_CONVERTERS[item.workflow]
+    params = {name: getattr(item, name) for name in param_names}
+    started = time.perf_counter()
+    try:
+        converted = await convert_cached(item.workflow, convert, item.content, **params)
+    except Exception as e:
+        result.duration_seconds = time.perf_counter() - started
+        result.error = str(e) or type(e).__name__
+        return result
+
+    result.duration_seconds = converted.duration_seconds if not converted.from_cache else time.perf_counter() - started
+    result.rows_count = converted.rows_count
+    result.abrechnungsmonat = converted.abrechnungsmonat
+    result.cached = converted.from_cache
+    if converted.rows_count == 0:
+        result.error = "Keine Datensätze gefunden"
+        return result
+    result.success = True
+    result.output = converted.output
+    return result
+
+
+def _assign_output_filenames(results: List[BulkItemResult]) -> None:
+    """Eindeutige CSV-Namen: <Dateiname>_<Workflow>_<Mandant>_<Monat>.csv"""
+    used = set()
+    for result in results:
+        if not result.success:
+            continue
+        stem = os.path.splitext(os.path.basename(result.filename))[0]
+        base = f"{stem}_{result.workflow}_{result.mandant}_{result.abrechnungsmonat}"
+        name, counter = f"{base}.csv", 2
+        while name in used:
+            name, counter = f"{base}_{counter}.csv", counter + 1
+        used.add(name)
+        result.output_filename = name
+
+
+async def convert_bulk(items: List[BulkItem]) -> List[BulkItemResult]:
+    """Konvertiert alle Dateien parallel (Prozess-Pool begrenzt die gleichzeitigen Konvertierungen)"""
+    results = list(await asyncio.gather(*(convert_bulk_item(item) for item in items)))
+    _assign_output_filenames(results)
+    for result in results:
+        if result.success:
+            print(f"✅ {result.filename}: {result.rows_count} Zeilen ({result.workflow}, {result.duration_seconds:.2f}s)")
+        else:
+            print(f"❌ {result.filename}: {result.error}")
+    return results
+
+
+def bulk_report(results: List[BulkItemResult]) -> dict:
+    return {
+        "files": len(results),
+        "succeeded": sum(1 for r in results if r.success),
+        "failed": sum(1 for r in results if not r.success),
+        "rows_processed": sum(r.rows_count for r in results if r.success),
+        "results": [r.to_dict() for r in results],
+    }
+
+
+def build_bulk_archive(results: List[BulkItemResult]) -> bytes:
+    """ZIP mit allen erzeugten CSV-Dateien und einem Bericht (bericht.json) über alle Dateien"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for result in results:
+            if result.success:
+                zf.writestr(result.output_filename, result.output)
+        zf.writestr("bericht.json", json.dumps(bulk_report(results), ensure_ascii=False, indent=2))
+    return buffer.getvalue()
+
+
+def _email_job_for(recipient: str, results: List[BulkItemResult]) -> EmailJob:
+    """Eine Nachricht je Empfänger: eine Datei als CSV-Anhang, mehrere als ZIP"""
+    monate = sorted({r.abrechnungsmonat for r in results if r.abrechnungsmonat})
+    abrechnungsmonat = ", ".join(monate)
+    rows_count = sum(r.rows_count for r in results)
+    if len(results) == 1:
+        return EmailJob(recipient, results[0].output, abrechnungsmonat, rows_count, results[0].output_filename)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for result in results:
+            zf.writestr(result.output_filename, result.output)
+    return EmailJob(recipient, buffer.getvalue(), abrechnungsmonat, rows_count,
+                    f"lohnabrechnungen_{'_'.join(monate)}.zip")
+
+
+async def send_bulk_results(results: List[BulkItemResult]) -> List[dict]:
+    """Versendet die erfolgreichen Konvertierungen gruppiert nach Empfänger (ein Batch über gemeinsame Verbindungen)"""
+    by_recipient: Dict[str, List[BulkItemResult]] = {}
+    for result in results:
+        if not result.success:
+            continue
+        if not result.email:
+            result.success = False
+            result.error = "Keine E-Mail-Adresse zugeordnet"
+            continue
+        by_recipient.setdefault(result.email, []).append(result)
+
+    if not by_recipient:
+        return []
+    jobs = [_email_job_for(recipient, group) for recipient, group in by_recipient.items()]
+    email_results = await run_io(send_email_batch, jobs)
+
+    deliveries = []
+    for job, email_result, group in zip(jobs, email_results, by_recipient.values()):
+        if not email_result.success:
+            for result in group:
+                result.success = False
+                result.error = f"E-Mail-Versand fehlgeschlagen: {email_result.error}"
+        deliveries.append({
+            "email": job.recipient_email,
+            "attachment": job.attachment_name,
+            "files": [r.filename for r in group],
+            "success": email_result.success,
+            "transport": email_result.transport,
+            "error": email_result.error,
+        })
+    return deliveries
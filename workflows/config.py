@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+from functools import lru_cache
+from typing import Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class EmailSettings(BaseSettings):
+    """
+    E-Mail-Konfiguration, einmal beim Start aus Umgebungsvariablen bzw. .env gelesen.
+    Die Feldnamen entsprechen den bisherigen Variablen (SENDER_EMAIL, SMTP_SERVER, MAILGUN_API_KEY, ...).
+    """
+    # Leere Variablen (z.B. SMTP_PORT=) gelten als nicht gesetzt und fallen auf den Standardwert zurück
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore", env_ignore_empty=True)
+
+    # SMTP (z.B. Mailgun SMTP)
+    sender_email: Optional[str] = None
+    sender_password: Optional[str] = None
+    smtp_server: Optional[str] = None
+    smtp_port: int = 587
+    smtp_pool_size: int = 4
+    smtp_pool_idle_seconds: float = 60
+    smtp_timeout_seconds: float = 30
+
+    # Mailgun HTTP API
+    mailgun_api_key: Optional[str] = None
+    mailgun_domain: Optional[str] = None
+    mailgun_from: Optional[str] = None
+    mailgun_api_base_url: str = "https://api.mailgun.net/v3"
+    mailgun_connect_timeout: float = 5
+    mailgun_read_timeout: float = 30
+    mailgun_max_retries: int = 3
+    mailgun_backoff_factor: float = 0.5
+
+    # Batch-Versand und Circuit Breaker je Transport
+    email_batch_parallelism: int = 4
+    email_circuit_failure_threshold: int = 3
+    email_circuit_reset_seconds: float = 60
+
+    @property
+    def smtp_configured(self) -> bool:
+        return all([self.sender_email, self.sender_password, self.smtp_server])
+
+    @property
+    def mailgun_configured(self) -> bool:
+        return all([self.mailgun_api_key, self.mailgun_domain, self.mailgun_from])
+
+
+@lru_cache()
+def get_email_settings() -> EmailSettings:
+    return EmailSettings()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import csv
+import io
+import os
+import time
+from typing import Iterable, Optional, Sequence
+
+from workflows.metrics import METRICS_ENABLED, TimedIterator, record_stage
+
+# Spalten der Lohnarten-CSV, die alle Konverter erzeugen
+OUTPUT_COLUMNS = ["Mandant", "Personalnummer", "Abrechnungsmonat", "Lohnart", "Betrag", "Einheit", "Kostenstelle"]
+
+
+class CsvRecordWriter:
+    """
+    Schreibt Datensätze direkt beim Erzeugen in die CSV-Datei und zählt die geschriebenen Zeilen.
+    Das Format entspricht DataFrame.to_csv(sep=";", index=False, encoding="utf-8").
+    Ohne Pfad wird im Speicher geschrieben; getvalue() liefert dann den Inhalt (z.B. als E-Mail-Anhang).
+    """
+
+    def __init__(self, path: Optional[str] = None, columns: Sequence[str] = OUTPUT_COLUMNS, sep: str = ";"):
+        self.path = path
+        self.rows_written = 0
+        self._file = open(path, "w", encoding="utf-8", newline="") if path else io.StringIO(newline="")
+        self._writer = csv.writer(self._file, delimiter=sep, lineterminator=os.linesep, quoting=csv.QUOTE_MINIMAL)
+        self._writer.writerow(columns)
+
+    def __enter__(self) -> "CsvRecordWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def write(self, record: Sequence) -> None:
+        self._writer.writerow(record)
+        self.rows_written += 1
+
+    def write_many(self, records: Iterable[Sequence]) -> int:
+        """Schreibt alle Datensätze eines Iterators, ohne sie vorher zu sammeln"""
+        if METRICS_ENABLED:
+            return self._write_many_timed(records)
+        for record in records:
+            self.write(record)
+        return self.rows_written
+
+    def _write_many_timed(self, records: Iterable[Sequence]) -> int:
+        """
+        Wie write_many, mit Messung: Bei einem Generator wird die Zeit für das Erzeugen der
+        Datensätze als "conversion", der Rest als "csv_write" erfasst.
+        """
+        started, rows_before = time.perf_counter(), self.rows_written
+        timed = None if isinstance(records, (list, tuple)) else TimedIterator(records)
+        for record in timed if timed is not None else records:
+            self.write(record)
+        elapsed = time.perf_counter() - started
+        rows = self.rows_written - rows_before
+        if timed is not None:
+            record_stage("conversion", timed.seconds, rows=rows)
+            elapsed -= timed.seconds
+        record_stage("csv_write", elapsed, rows=rows)
+        return self.rows_written
+
+    def write_rows(self, records: Sequence[Sequence]) -> int:
+        """Schreibt bereits vollständig erzeugte Datensätze in einem Aufruf (csv.writer.writerows)"""
+        started = time.perf_counter()
+        self._writer.writerows(records)
+        self.rows_written += len(records)
+        record_stage("csv_write", time.perf_counter() - started, rows=len(records))
+        return self.rows_written
+
+    def getvalue(self) -> bytes:
+        """UTF-8-Inhalt der im Speicher geschriebenen CSV"""
+        return self._file.getvalue().encode("utf-8")
+
+    def close(self) -> None:
+        # Im Speicher bleibt der Puffer für getvalue() erhalten
+        if self.path and not self._file.closed:
+            self._file.close()
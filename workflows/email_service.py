@@ -1,23 +1,238 @@
 #!/usr/bin/env python3
+import mimetypes
 import os
 import smtplib
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from workflows.config import EmailSettings, get_email_settings
+from workflows.executor import run_io
+from workflows.metrics import stage
 
-def send_email_smtp(recipient_email: str, file_path: str, abrechnungsmonat: str, rows_count: int) -> bool:
+class SMTPPoolExhausted(smtplib.SMTPException):
+    """Alle Verbindungen des Pools waren bis zum Timeout belegt (Überlast der App, kein Fehler des Servers)"""
+
+class SMTPConnectionPool:
+    """
+    Hält authentifizierte SMTP-Sitzungen (STARTTLS + Login) offen und verteilt sie threadsicher.
+    Vor der Wiederverwendung wird jede Verbindung per NOOP geprüft; bricht eine wiederverwendete
+    Verbindung beim Senden ab, wird einmal transparent mit einer neuen Verbindung wiederholt.
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: str, max_size: int = 4,
+                 max_idle_seconds: float = 60, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_idle_seconds = max_idle_seconds
+        self.timeout = timeout
+        self._idle = []  # (Verbindung, Zeitpunkt der letzten Nutzung)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_size))
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()
+            server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        return server
+
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _acquire(self) -> Tuple[smtplib.SMTP, bool]:
+        """Liefert (Verbindung, wiederverwendet)"""
+        # Auf eine freie Verbindung warten statt sofort abzubrechen
+        if not self._slots.acquire(timeout=self.timeout):
+            raise SMTPPoolExhausted(f"Keine freie SMTP-Verbindung im Pool nach {self.timeout:g} s")
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    return self._connect(), False
+                server, last_used = item
+                if time.monotonic() - last_used <= self.max_idle_seconds and self._is_alive(server):
+                    return server, True
+                self._close(server)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, server: smtplib.SMTP, healthy: bool) -> None:
+        try:
+            if healthy:
+                with self._lock:
+                    self._idle.append((server, time.monotonic()))
+            else:
+                self._close(server)
+        finally:
+            self._slots.release()
+
+    def sendmail(self, from_addr: str, to_addrs, msg: str) -> None:
+        for attempt in range(2):
+            server, reused = self._acquire()
+            try:
+                server.sendmail(from_addr, to_addrs, msg)
+            except Exception as e:
+                self._release(server, healthy=False)
+                disconnected = isinstance(e, smtplib.SMTPServerDisconnected) or (
+                    isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+                )
+                if reused and disconnected and attempt == 0:
+                    print("SMTP-Verbindung abgebrochen, verbinde neu...")
+                    continue
+                raise
+            self._release(server, healthy=True)
+            return
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+_smtp_pools: Dict[Tuple[str, int, str], SMTPConnectionPool] = {}
+_smtp_pools_lock = threading.Lock()
+
+def get_smtp_pool(settings: EmailSettings) -> SMTPConnectionPool:
+    """
+    Liefert den Pool für eine SMTP-Konfiguration (ein Pool je Server/Benutzer). Die Einstellungen
+    gelten für die Laufzeit der App; wer sie neu lädt, schließt vorher die Pools (close_smtp_pools).
+    """
+    key = (settings.smtp_server, settings.smtp_port, settings.sender_email)
+    with _smtp_pools_lock:
+        pool = _smtp_pools.get(key)
+        if pool is None:
+            pool = _smtp_pools[key] = SMTPConnectionPool(
+                settings.smtp_server,
+                settings.smtp_port,
+                settings.sender_email,
+                settings.sender_password,
+                max_size=settings.smtp_pool_size,
+                max_idle_seconds=settings.smtp_pool_idle_seconds,
+                timeout=settings.smtp_timeout_seconds,
+            )
+        return pool
+
+def close_smtp_pools() -> None:
+    """Schließt alle offenen SMTP-Verbindungen (beim Herunterfahren der App)"""
+    with _smtp_pools_lock:
+        pools = list(_smtp_pools.values())
+        _smtp_pools.clear()
+    for pool in pools:
+        pool.close()
+
+# Mailgun HTTP: Wiederholungen bei 429/5xx mit exponentiellem Backoff (Anzahl und Timeouts in EmailSettings)
+MAILGUN_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_mailgun_session: Optional[requests.Session] = None
+_mailgun_session_lock = threading.Lock()
+
+def get_mailgun_session() -> requests.Session:
+    """Gemeinsame HTTP-Session mit Keep-Alive-Verbindungspool und Retry-Strategie für die Mailgun-API"""
+    global _mailgun_session
+    with _mailgun_session_lock:
+        if _mailgun_session is None:
+            settings = get_email_settings()
+            retry = Retry(
+                total=settings.mailgun_max_retries,
+                # Nach Lesefehlern nicht wiederholen: Mailgun hat die Nachricht evtl. schon angenommen
+                read=0,
+                backoff_factor=settings.mailgun_backoff_factor,
+                status_forcelist=MAILGUN_RETRY_STATUS,
+                allowed_methods=frozenset({"POST"}),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=2, pool_maxsize=10)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _mailgun_session = session
+        return _mailgun_session
+
+def close_mailgun_session() -> None:
+    global _mailgun_session
+    with _mailgun_session_lock:
+        if _mailgun_session is not None:
+            _mailgun_session.close()
+            _mailgun_session = None
+
+def mailgun_post(url: str, api_key: str, data: dict, files=None) -> requests.Response:
+    """POST an die Mailgun-API über die gemeinsame Session mit expliziten Connect-/Read-Timeouts"""
+    settings = get_email_settings()
+    return get_mailgun_session().post(
+        url,
+        auth=("api", api_key),
+        files=files,
+        data=data,
+        timeout=(settings.mailgun_connect_timeout, settings.mailgun_read_timeout),
+    )
+
+# Fehlerart des laufenden Versands je Thread: nur Verbindungs-/Transportfehler zählen für den Circuit Breaker
+_last_send = threading.local()
+
+def _mark_transport_error() -> None:
+    _last_send.transport_error = True
+
+def _is_smtp_transport_error(e: Exception) -> bool:
+    """
+    Verbindungs-, TLS- und Anmeldefehler. Abgelehnte Empfänger oder Inhalte betreffen nur die Nachricht,
+    ein voller Pool nur die Auslastung der App.
+    """
+    if isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, SMTPPoolExhausted)):
+        return False
+    # smtplib.SMTPException ist wie Socket- und SSL-Fehler ein OSError
+    return isinstance(e, OSError)
+
+def _is_mailgun_transport_status(status_code: int) -> bool:
+    """Überlast/Ausfall (429, 5xx) und ungültige Zugangsdaten (401, 403); übrige 4xx betreffen nur die Nachricht"""
+    return status_code in (401, 403, 429) or status_code >= 500
+
+def _read_attachment(attachment: Union[str, bytes]) -> Optional[bytes]:
+    """Anhang als Bytes; ein Pfad wird eingelesen (fehlt die Datei, wird ohne Anhang versendet)"""
+    if isinstance(attachment, (bytes, bytearray)):
+        return bytes(attachment)
+    if attachment and os.path.exists(attachment):
+        with open(attachment, "rb") as f:
+            return f.read()
+    return None
+
+def send_email_smtp(recipient_email: str, attachment: Union[str, bytes], abrechnungsmonat: str, rows_count: int,
+                    attachment_name: Optional[str] = None) -> bool:
     """Sendet die CSV-Datei per E-Mail über SMTP (Mailgun SMTP)"""
     try:
-        sender_email = os.getenv("SENDER_EMAIL")
-        sender_password = os.getenv("SENDER_PASSWORD")
-        smtp_server = os.getenv("SMTP_SERVER")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
+        settings = get_email_settings()
+        sender_email = settings.sender_email
         
-        if not all([sender_email, sender_password, smtp_server]):
+        if not settings.smtp_configured:
             print("SMTP-Konfiguration unvollständig")
+            _mark_transport_error()
             return False
         
         # E-Mail erstellen
@@ -41,40 +256,38 @@ OTQ GmbH
         msg.attach(MIMEText(body, 'plain', 'utf-8'))
         
         # Datei anhängen
-        if os.path.exists(file_path):
-            with open(file_path, "rb") as attachment:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment.read())
+        content = _read_attachment(attachment)
+        if content is not None:
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(content)
             
             encoders.encode_base64(part)
-            filename = f"lohnabrechnung_{abrechnungsmonat}.csv"
+            filename = attachment_name or f"lohnabrechnung_{abrechnungsmonat}.csv"
             part.add_header('Content-Disposition', f'attachment; filename= {filename}')
             msg.attach(part)
         
         # E-Mail senden
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, recipient_email, msg.as_string())
-        server.quit()
+        pool = get_smtp_pool(settings)
+        pool.sendmail(sender_email, recipient_email, msg.as_string())
         
         print(f"✅ E-Mail erfolgreich gesendet via SMTP")
         return True
         
     except Exception as e:
         print(f"❌ SMTP Fehler: {str(e)}")
+        if _is_smtp_transport_error(e):
+            _mark_transport_error()
         return False
 
 def send_simple_email_smtp(recipient_email: str, subject: str, body: str) -> bool:
     """Sendet eine einfache Text-E-Mail über SMTP"""
     try:
-        sender_email = os.getenv("SENDER_EMAIL")
-        sender_password = os.getenv("SENDER_PASSWORD")
-        smtp_server = os.getenv("SMTP_SERVER")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
+        settings = get_email_settings()
+        sender_email = settings.sender_email
         
-        if not all([sender_email, sender_password, smtp_server]):
+        if not settings.smtp_configured:
             print("SMTP-Konfiguration unvollständig")
+            _mark_transport_error()
             return False
         
         msg = MIMEMultipart()
@@ -84,30 +297,32 @@ def send_simple_email_smtp(recipient_email: str, subject: str, body: str) -> boo
         
         msg.attach(MIMEText(body, 'plain', 'utf-8'))
         
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, recipient_email, msg.as_string())
-        server.quit()
+        pool = get_smtp_pool(settings)
+        pool.sendmail(sender_email, recipient_email, msg.as_string())
         
         print(f"✅ Test-E-Mail erfolgreich gesendet via SMTP")
         return True
         
     except Exception as e:
         print(f"❌ SMTP Fehler: {str(e)}")
+        if _is_smtp_transport_error(e):
+            _mark_transport_error()
         return False
 
-def send_email_mailgun(recipient_email: str, file_path: str, abrechnungsmonat: str, rows_count: int) -> bool:
+def send_email_mailgun(recipient_email: str, attachment: Union[str, bytes], abrechnungsmonat: str, rows_count: int,
+                       attachment_name: Optional[str] = None) -> bool:
     """Sendet die CSV-Datei per E-Mail über Mailgun API"""
     try:
         # Mailgun Konfiguration
-        api_key = os.getenv("MAILGUN_API_KEY")
-        domain = os.getenv("MAILGUN_DOMAIN")
-        base_url = os.getenv("MAILGUN_API_BASE_URL", "https://api.mailgun.net/v3")
-        from_email = os.getenv("MAILGUN_FROM")
+        settings = get_email_settings()
+        api_key = settings.mailgun_api_key
+        domain = settings.mailgun_domain
+        base_url = settings.mailgun_api_base_url
+        from_email = settings.mailgun_from
         
-        if not all([api_key, domain, from_email]):
+        if not settings.mailgun_configured:
             print("Mailgun-Konfiguration unvollständig")
+            _mark_transport_error()
             return False
         
         # E-Mail Inhalt
@@ -126,17 +341,17 @@ OTQ GmbH
         
         # Datei für Anhang vorbereiten
         files = []
-        if os.path.exists(file_path):
-            filename = f"lohnabrechnung_{abrechnungsmonat}.csv"
-            with open(file_path, 'rb') as f:
-                files = [("attachment", (filename, f.read(), "text/csv"))]
+        content = _read_attachment(attachment)
+        if content is not None:
+            filename = attachment_name or f"lohnabrechnung_{abrechnungsmonat}.csv"
+            files = [("attachment", (filename, content, mimetypes.guess_type(filename)[0] or "text/csv"))]
         
         # Mailgun API Request
         url = f"{base_url}/{domain}/messages"
         
-        response = requests.post(
+        response = mailgun_post(
             url,
-            auth=("api", api_key),
+            api_key,
             files=files,
             data={
                 "from": from_email,
@@ -151,31 +366,37 @@ OTQ GmbH
             return True
         else:
             print(f"❌ Mailgun Fehler: {response.status_code} - {response.text}")
+            if _is_mailgun_transport_status(response.status_code):
+                _mark_transport_error()
             return False
             
     except Exception as e:
         print(f"❌ Mailgun Fehler: {str(e)}")
+        if isinstance(e, requests.RequestException):
+            _mark_transport_error()
         return False
 
 def send_simple_email_mailgun(recipient_email: str, subject: str, body: str) -> bool:
     """Sendet eine einfache Text-E-Mail über Mailgun"""
     try:
         # Mailgun Konfiguration
-        api_key = os.getenv("MAILGUN_API_KEY")
-        domain = os.getenv("MAILGUN_DOMAIN")
-        base_url = os.getenv("MAILGUN_API_BASE_URL", "https://api.mailgun.net/v3")
-        from_email = os.getenv("MAILGUN_FROM")
+        settings = get_email_settings()
+        api_key = settings.mailgun_api_key
+        domain = settings.mailgun_domain
+        base_url = settings.mailgun_api_base_url
+        from_email = settings.mailgun_from
         
-        if not all([api_key, domain, from_email]):
+        if not settings.mailgun_configured:
             print("Mailgun-Konfiguration unvollständig")
+            _mark_transport_error()
             return False
         
         # Mailgun API Request
         url = f"{base_url}/{domain}/messages"
         
-        response = requests.post(
+        response = mailgun_post(
             url,
-            auth=("api", api_key),
+            api_key,
             data={
                 "from": from_email,
                 "to": recipient_email,
@@ -189,65 +410,235 @@ def send_simple_email_mailgun(recipient_email: str, subject: str, body: str) ->
             return True
         else:
             print(f"❌ Mailgun Fehler: {response.status_code} - {response.text}")
+            if _is_mailgun_transport_status(response.status_code):
+                _mark_transport_error()
             return False
             
     except Exception as e:
         print(f"❌ Mailgun Fehler: {str(e)}")
+        if isinstance(e, requests.RequestException):
+            _mark_transport_error()
         return False
 
+class CircuitBreaker:
+    """
+    Schützt einen Transport: nach `failure_threshold` Verbindungs-/Transportfehlern in Folge wird er
+    für `reset_seconds` übersprungen (open). Danach darf genau ein Probe-Versand durch (half_open);
+    gelingt er, ist der Transport wieder verfügbar (closed), sonst bleibt er offen.
+    Abgelehnte Nachrichten (z.B. ungültiger Empfänger) zählen nicht als Fehler des Transports.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 60):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+@dataclass
+class EmailTransport:
+    name: str
+    send_report: Callable[[str, Union[str, bytes], str, int, Optional[str]], bool]
+    send_simple: Callable[[str, str, str], bool]
+    breaker: CircuitBreaker
+
+    def send(self, kind: str, *args, force: bool = False) -> Optional[bool]:
+        """
+        Versendet über diesen Transport; None, wenn der Circuit Breaker ihn gerade überspringt.
+        force=True versendet auch bei offenem Circuit Breaker (letzter verfügbarer Transport).
+        """
+        if not self.breaker.allow_request() and not force:
+            return None
+        send = self.send_report if kind == "report" else self.send_simple
+        attachment, rows = (args[1], args[3]) if kind == "report" else (None, 0)
+        with stage("email_send", transport=self.name, rows=rows,
+                   bytes=len(attachment) if isinstance(attachment, (bytes, bytearray)) else 0) as timing:
+            _last_send.transport_error = False
+            ok = send(*args)
+            timing.failed = not ok
+        if ok or not _last_send.transport_error:
+            # Auch eine abgelehnte Nachricht zeigt, dass der Transport erreichbar ist
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+            if self.breaker.state == "open":
+                print(f"⚠️ {self.name} vorübergehend deaktiviert ({self.breaker.failures} Fehler in Folge)")
+        return ok
+
+class TransportRegistry:
+    """Konfigurierte Transporte in Prioritätsreihenfolge (SMTP vor Mailgun), einmal beim Start aufgebaut"""
+
+    def __init__(self, settings: EmailSettings):
+        self.transports: List[EmailTransport] = []
+        if settings.smtp_configured:
+            self.transports.append(EmailTransport(
+                "smtp", send_email_smtp, send_simple_email_smtp,
+                CircuitBreaker(settings.email_circuit_failure_threshold, settings.email_circuit_reset_seconds)
+            ))
+        if settings.mailgun_configured:
+            self.transports.append(EmailTransport(
+                "mailgun", send_email_mailgun, send_simple_email_mailgun,
+                CircuitBreaker(settings.email_circuit_failure_threshold, settings.email_circuit_reset_seconds)
+            ))
+
+    def deliver(self, kind: str, *args) -> Optional[str]:
+        """
+        Versucht die Transporte der Reihe nach; liefert den Namen des erfolgreichen Transports.
+        Der letzte Transport wird immer versucht, auch wenn sein Circuit Breaker offen ist.
+        """
+        for transport in self.transports:
+            ok = transport.send(kind, *args, force=transport is self.transports[-1])
+            if ok:
+                return transport.name
+            if ok is None:
+                print(f"{transport.name} übersprungen (Circuit Breaker offen), versuche nächsten Transport...")
+            else:
+                print(f"{transport.name} fehlgeschlagen, versuche nächsten Transport...")
+        return None
+
+    def stats(self) -> dict:
+        return {transport.name: transport.breaker.snapshot() for transport in self.transports}
+
+_transport_registry: Optional[TransportRegistry] = None
+_transport_registry_lock = threading.Lock()
+
+def init_transport_registry(settings: Optional[EmailSettings] = None) -> TransportRegistry:
+    """Baut die Transport-Registry aus der Konfiguration auf (beim Start der App)"""
+    global _transport_registry
+    with _transport_registry_lock:
+        _transport_registry = TransportRegistry(settings or get_email_settings())
+        return _transport_registry
+
+def get_transport_registry() -> TransportRegistry:
+    if _transport_registry is None:
+        return init_transport_registry()
+    return _transport_registry
+
 # Hauptfunktionen - versuchen SMTP zuerst, dann Mailgun
-def send_email(recipient_email: str, file_path: str, abrechnungsmonat: str, rows_count: int) -> bool:
+def send_email(recipient_email: str, attachment: Union[str, bytes], abrechnungsmonat: str, rows_count: int,
+               attachment_name: Optional[str] = None) -> bool:
     """Hauptfunktion für E-Mail-Versand - versucht SMTP zuerst, dann Mailgun"""
-    # Prüfen welche Konfiguration verfügbar ist
-    smtp_available = all([
-        os.getenv("SENDER_EMAIL"),
-        os.getenv("SENDER_PASSWORD"), 
-        os.getenv("SMTP_SERVER")
-    ])
-    
-    mailgun_available = all([
-        os.getenv("MAILGUN_API_KEY"),
-        os.getenv("MAILGUN_DOMAIN"),
-        os.getenv("MAILGUN_FROM")
-    ])
-    
-    # SMTP zuerst versuchen (falls konfiguriert)
-    if smtp_available:
-        if send_email_smtp(recipient_email, file_path, abrechnungsmonat, rows_count):
-            return True
-        print("SMTP fehlgeschlagen, versuche Mailgun...")
-    
-    # Fallback zu Mailgun
-    if mailgun_available:
-        return send_email_mailgun(recipient_email, file_path, abrechnungsmonat, rows_count)
-    
-    print("❌ Keine E-Mail-Konfiguration verfügbar")
-    return False
+    registry = get_transport_registry()
+    if not registry.transports:
+        print("❌ Keine E-Mail-Konfiguration verfügbar")
+        return False
+    return registry.deliver("report", recipient_email, attachment, abrechnungsmonat, rows_count, attachment_name) is not None
 
 def send_simple_email(recipient_email: str, subject: str, body: str) -> bool:
     """Hauptfunktion für einfache E-Mails - versucht SMTP zuerst, dann Mailgun"""
-    # Prüfen welche Konfiguration verfügbar ist
-    smtp_available = all([
-        os.getenv("SENDER_EMAIL"),
-        os.getenv("SENDER_PASSWORD"), 
-        os.getenv("SMTP_SERVER")
-    ])
-    
-    mailgun_available = all([
-        os.getenv("MAILGUN_API_KEY"),
-        os.getenv("MAILGUN_DOMAIN"),
-        os.getenv("MAILGUN_FROM")
-    ])
-    
-    # SMTP zuerst versuchen (falls konfiguriert)
-    if smtp_available:
-        if send_simple_email_smtp(recipient_email, subject, body):
-            return True
-        print("SMTP fehlgeschlagen, versuche Mailgun...")
-    
-    # Fallback zu Mailgun
-    if mailgun_available:
-        return send_simple_email_mailgun(recipient_email, subject, body)
-    
-    print("❌ Keine E-Mail-Konfiguration verfügbar")
-    return False
+    registry = get_transport_registry()
+    if not registry.transports:
+        print("❌ Keine E-Mail-Konfiguration verfügbar")
+        return False
+    return registry.deliver("simple", recipient_email, subject, body) is not None
+
+# Batch-Versand: viele Berichte mit begrenzter Parallelität über gemeinsame Verbindungen
+@dataclass
+class EmailJob:
+    recipient_email: str
+    attachment: Union[str, bytes]  # Inhalt oder Pfad der Datei
+    abrechnungsmonat: str
+    rows_count: int = 0
+    attachment_name: Optional[str] = None  # Standard: lohnabrechnung_<Monat>.csv
+
+@dataclass
+class EmailResult:
+    recipient_email: str
+    success: bool
+    transport: Optional[str] = None
+    error: Optional[str] = None
+
+def _send_parallel(transport: EmailTransport, jobs: List[EmailJob], parallelism: int,
+                   force: bool = False) -> List[Optional[bool]]:
+    if not jobs:
+        return []
+    workers = max(1, min(parallelism, len(jobs)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email-batch") as executor:
+        return list(executor.map(
+            lambda job: transport.send("report", job.recipient_email, job.attachment, job.abrechnungsmonat, job.rows_count,
+                                       job.attachment_name, force=force),
+            jobs
+        ))
+
+def send_email_batch(jobs: List[EmailJob], parallelism: Optional[int] = None) -> List[EmailResult]:
+    """
+    Versendet mehrere Berichte auf einmal, gruppiert nach Transport:
+    zuerst gehen alle Nachrichten parallel über den SMTP-Pool, die fehlgeschlagenen anschließend
+    gesammelt über die gemeinsame Mailgun-Session. Liefert ein Ergebnis je Nachricht (gleiche Reihenfolge).
+    """
+    registry = get_transport_registry()
+    parallelism = parallelism or get_email_settings().email_batch_parallelism
+    results = [EmailResult(job.recipient_email, False) for job in jobs]
+    pending = list(range(len(jobs)))
+
+    for transport in registry.transports:
+        if not pending:
+            break
+        # Der letzte Transport wird wie bei deliver() auch bei offenem Circuit Breaker versucht
+        outcomes = _send_parallel(transport, [jobs[i] for i in pending], parallelism,
+                                  force=transport is registry.transports[-1])
+        for i, ok in zip(pending, outcomes):
+            if ok:
+                results[i].success = True
+                results[i].transport = transport.name
+                results[i].error = None
+            elif ok is None:
+                results[i].error = f"{transport.name} übersprungen (Circuit Breaker offen)"
+            else:
+                results[i].error = f"Versand über {transport.name} fehlgeschlagen"
+        pending = [i for i in pending if not results[i].success]
+
+    if not registry.transports:
+        print("❌ Keine E-Mail-Konfiguration verfügbar")
+        for result in results:
+            result.error = "Keine E-Mail-Konfiguration verfügbar"
+
+    print(f"📧 Batch-Versand: {len(jobs) - len(pending)}/{len(jobs)} erfolgreich")
+    return results
+
+# Async-Varianten für Aufrufer im Event-Loop: blockierender Versand läuft im I/O-Thread-Pool
+async def send_email_async(recipient_email: str, attachment: Union[str, bytes], abrechnungsmonat: str, rows_count: int,
+                           attachment_name: Optional[str] = None) -> bool:
+    return await run_io(send_email, recipient_email, attachment, abrechnungsmonat, rows_count, attachment_name)
+
+async def send_simple_email_async(recipient_email: str, subject: str, body: str) -> bool:
+    return await run_io(send_simple_email, recipient_email, subject, body)
+
+async def send_email_batch_async(jobs: List[EmailJob], parallelism: Optional[int] = None) -> List[EmailResult]:
+    return await run_io(send_email_batch, jobs, parallelism)
+
+async def send_email_mailgun_async(recipient_email: str, attachment: Union[str, bytes], abrechnungsmonat: str, rows_count: int,
+                                   attachment_name: Optional[str] = None) -> bool:
+    return await run_io(send_email_mailgun, recipient_email, attachment, abrechnungsmonat, rows_count, attachment_name)
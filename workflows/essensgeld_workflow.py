@@ -1,24 +1,109 @@
+import io
+import numpy as np
 import pandas as pd
 import os
-from fastapi import UploadFile
-from tempfile import NamedTemporaryFile
+import time
+from fastapi import HTTPException, UploadFile
+from itertools import repeat
+from typing import Iterator, List, Optional, Sequence
+from workflows.csv_output import CsvRecordWriter
+from workflows.email_service import send_email
+from workflows.executor import run_io
+from workflows.jobs import Job, mark_stage
+from workflows.metrics import stage
+from workflows.number_format import format_number_german, format_numbers_german
+from workflows.result_cache import convert_cached
+from workflows.results import ConversionResult
 
-def convert_essensgeld_from_upload(file: UploadFile, mandant="10001", abrechnungsmonat=None) -> str:
+# Konvertierungs-Engine: "vectorized" (spaltenweise) oder "legacy" (zeilenweise mit iterrows, ursprünglicher Algorithmus)
+ESSENSGELD_ENGINE = os.getenv("ESSENSGELD_ENGINE", "vectorized")
+ESSENSGELD_ENGINES = ("vectorized", "legacy")
+
+def convert_essensgeld_from_upload(file: UploadFile, mandant="10001", abrechnungsmonat=None) -> ConversionResult:
     """
-    Nimmt eine Excel-Datei (UploadFile), konvertiert sie ins gewünschte Format und gibt den Pfad zur Ausgabedatei zurück.
+    Nimmt eine Excel-Datei (UploadFile), konvertiert sie ins gewünschte Format und gibt das Ergebnis
+    (CSV-Inhalt im Speicher, Zeilenanzahl, Abrechnungsmonat) als ConversionResult zurück.
     """
-    # Speichere Upload temporär
-    with NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-        tmp.write(file.file.read())
-        tmp_path = tmp.name
+    return convert_essensgeld_content(file.file.read(), mandant, abrechnungsmonat)
 
-    df = pd.read_excel(tmp_path, sheet_name="Tabelle1")
-    df.columns = df.columns.astype(str).str.strip()
+def convert_essensgeld_content(content: bytes, mandant="10001", abrechnungsmonat=None,
+                               sheet_name="Tabelle1") -> ConversionResult:
+    """
+    Konvertiert den Inhalt einer Essensgeld-Excel-Datei. Nimmt nur picklebare Argumente,
+    damit die Konvertierung im Prozess-Pool laufen kann.
+    """
+    started = time.perf_counter()
+    with stage("excel_parse", bytes=len(content)) as timing:
+        df = pd.read_excel(io.BytesIO(content), sheet_name=sheet_name)
+        timing.rows = len(df)
 
     if not abrechnungsmonat:
         abrechnungsmonat = pd.Timestamp.today().strftime("%Y%m")
 
-    rows_out = []
+    # Ausgabe direkt im Speicher schreiben (wird als E-Mail-Anhang versendet)
+    with stage("conversion") as timing:
+        records = essensgeld_records(df, mandant, abrechnungsmonat)
+        timing.rows = len(records)
+    with CsvRecordWriter() as writer:
+        writer.write_rows(records)
+    return ConversionResult.finished(started, writer.getvalue(), writer.rows_written, abrechnungsmonat)
+
+def essensgeld_records(df: pd.DataFrame, mandant: str, abrechnungsmonat: str,
+                       engine: Optional[str] = None) -> List[Sequence]:
+    """Datensätze eines eingelesenen Essensgeld-Arbeitsblatts (DataFrame mit Kopfzeile)"""
+    engine = engine or ESSENSGELD_ENGINE
+    if engine not in ESSENSGELD_ENGINES:
+        raise ValueError(f"Unbekannte Konvertierungs-Engine: {engine}")
+    df.columns = df.columns.astype(str).str.strip()
+    # Doppelte Spaltennamen liefern je Zeile mehrere Werte: dafür bleibt es beim ursprünglichen Verhalten
+    if engine == "legacy" or not df.columns.is_unique:
+        return list(_essensgeld_records_legacy(df, mandant, abrechnungsmonat))
+    return _essensgeld_records_vectorized(df, mandant, abrechnungsmonat)
+
+def _essensgeld_amount_column(columns: pd.Index) -> str:
+    if "Summe Essensgeld PK" in columns:
+        return "Summe Essensgeld PK"
+    return [c for c in columns if "Essensgeld" in c][0]
+
+def _iterrows_values(df: pd.DataFrame, positions: List[int]) -> np.ndarray:
+    """
+    Werte einzelner Spalten so, wie df.iterrows() sie liefert: jede Zeile im gemeinsamen Datentyp
+    aller Spalten (z.B. Personalnummer 100.0, wenn alle Spalten numerisch sind und eine davon float).
+    """
+    if any(dtype == object for dtype in df.dtypes):
+        # Mit einer Textspalte ist der gemeinsame Datentyp object: keine Umwandlung der übrigen Spalten nötig
+        return df.iloc[:, positions].to_numpy(dtype=object)
+    return df.values[:, positions]
+
+def _essensgeld_records_vectorized(df: pd.DataFrame, mandant: str, abrechnungsmonat: str) -> List[tuple]:
+    """
+    Spaltenweise Konvertierung: Betragsspalte einmal bestimmen, Beträge ungleich 0 per Maske
+    auswählen und die ganze Spalte auf einmal formatieren.
+    """
+    if len(df) == 0:
+        return []
+    personal_pos = df.columns.get_loc("Personalnummer")
+    betrag_pos = df.columns.get_loc(_essensgeld_amount_column(df.columns))
+
+    values = _iterrows_values(df, [personal_pos, betrag_pos])
+    betraege = values[:, 1]
+    present = np.asarray(pd.notna(betraege), dtype=bool)
+    amounts = np.zeros(len(betraege))
+    amounts[present] = betraege[present].astype(float)
+    keep = present & (amounts != 0)
+
+    personalnummern = values[keep, 0].astype(object)
+    texts = pd.Series(personalnummern, dtype=object).astype(str).str.strip().to_numpy(dtype=object)
+    texts[pd.isna(personalnummern)] = ""
+
+    n = int(keep.sum())
+    return list(zip(
+        repeat(mandant, n), texts, repeat(abrechnungsmonat, n), repeat("111", n),
+        format_numbers_german(amounts[keep]), repeat("EUR", n), repeat("", n)
+    ))
+
+def _essensgeld_records_legacy(df: pd.DataFrame, mandant: str, abrechnungsmonat: str) -> Iterator[list]:
+    """Ursprüngliche zeilenweise Konvertierung (Referenz-Implementierung)"""
     for _, row in df.iterrows():
         personalnummer = str(row["Personalnummer"]).strip() if pd.notna(row["Personalnummer"]) else ""
         if "Summe Essensgeld PK" in df.columns:
@@ -28,19 +113,41 @@ def convert_essensgeld_from_upload(file: UploadFile, mandant="10001", abrechnung
             betrag_val = row[betrag_col]
 
         if pd.notna(betrag_val) and float(betrag_val) != 0:
-            betrag = f"{float(betrag_val):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+            betrag = format_number_german(float(betrag_val))
             einheit = "EUR"
             lohnart = "111"
             kostenstelle = ""
-            rows_out.append([
-                mandant, personalnummer, abrechnungsmonat, lohnart, betrag, einheit, kostenstelle
-            ])
-
-    out_df = pd.DataFrame(rows_out, columns=[
-        "Mandant","Personalnummer","Abrechnungsmonat","Lohnart","Betrag","Einheit","Kostenstelle"
-    ])
-
-    # Speichere als temporäre CSV
-    output_path = tmp_path.replace('.xlsx', '_essensgeld.txt')
-    out_df.to_csv(output_path, sep=";", index=False, encoding="utf-8")
-    return output_path
+            yield [mandant, personalnummer, abrechnungsmonat, lohnart, betrag, einheit, kostenstelle]
+
+async def run_essensgeld_conversion(
+    content: bytes,
+    email: str,
+    mandant="10001",
+    abrechnungsmonat=None,
+    job: Optional[Job] = None,
+    content_hash: Optional[str] = None
+) -> dict:
+    """
+    Konvertiert den gelesenen Upload im Prozess-Pool und versendet das Ergebnis per E-Mail.
+    Im Job-Modus bleibt die Ausgabedatei für den Download erhalten.
+    """
+    result = await convert_cached(
+        "essensgeld", convert_essensgeld_content, content, content_hash=content_hash,
+        mandant=mandant, abrechnungsmonat=abrechnungsmonat
+    )
+    mark_stage(job, "converted")
+    if job is not None:
+        job.output = result.output
+        job.output_filename = f"lohnabrechnung_{result.abrechnungsmonat}.csv"
+
+    success = await run_io(send_email, email, result.output, result.abrechnungsmonat, result.rows_count)
+    if not success:
+        raise HTTPException(status_code=500, detail="E-Mail-Versand fehlgeschlagen.")
+    mark_stage(job, "emailed")
+    return {
+        "message": f"Essensgeld erfolgreich an {email} gesendet.",
+        "rows_processed": result.rows_count,
+        "abrechnungsmonat": result.abrechnungsmonat,
+        "duration_seconds": round(result.duration_seconds, 3),
+        "cached": result.from_cache
+    }
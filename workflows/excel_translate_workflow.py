@@ -1,71 +1,171 @@
+import io
 import os
 import pandas as pd
 import openpyxl
 import re
-from fastapi import UploadFile
-from tempfile import NamedTemporaryFile
+import time
+from fastapi import HTTPException, UploadFile
+from typing import BinaryIO, Iterable, Optional, Set
+from workflows.email_service import send_email
+from workflows.executor import run_io
+from workflows.jobs import Job, mark_stage
+from workflows.metrics import stage
+from workflows.results import ConversionResult
+from workflows.translation import get_translator_backend, translate_chunked
+from workflows.translation_cache import translation_cache
 
-try:
-    from deep_translator import GoogleTranslator
-    TRANSLATOR_AVAILABLE = True
-except ImportError:
-    TRANSLATOR_AVAILABLE = False
+# Hiragana, Katakana (inkl. phonetischer Erweiterungen und Halbbreiten-Katakana), Wiederholungs-
+# und Schließungszeichen (々〆〇), CJK-Ideogramme inkl. Erweiterung A/B und Kompatibilitätsideogramme
+JAPANESE_PATTERN = re.compile(
+    r'[\u3005-\u3007\u3040-\u309F\u30A0-\u30FF\u31F0-\u31FF\u3400-\u4DBF\u4E00-\u9FFF'
+    r'\uF900-\uFAFF\uFF66-\uFF9F\U00020000-\U0002A6DF]'
+)
+_search_japanese = JAPANESE_PATTERN.search
+
+# Dateiname der übersetzten Datei im E-Mail-Anhang und beim Job-Download
+OUTPUT_FILENAME = "uebersetzung.xlsx"
 
 def has_japanese_characters(text):
     if not text or not isinstance(text, str):
         return False
-    japanese_pattern = r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]'
-    return bool(re.search(japanese_pattern, text))
+    # Reine ASCII-Texte (Zahlen, Codes, deutsche Bezeichnungen ohne Umlaute) sofort aussortieren
+    if text.isascii():
+        return False
+    return _search_japanese(text) is not None
+
+def collect_japanese_texts(values: Iterable) -> Set[str]:
+    """Sammelt die einzigartigen Texte mit japanischen Zeichen; jeder Text wird nur einmal geprüft"""
+    candidates = {value for value in values if isinstance(value, str) and value and not value.isascii()}
+    return {text for text in candidates if _search_japanese(text) is not None}
 
-def translate_texts(texts_to_translate):
-    if not texts_to_translate or not TRANSLATOR_AVAILABLE:
+def translate_texts(texts_to_translate, source='ja', target='de'):
+    """
+    Übersetzt die Texte; bekannte Übersetzungen kommen aus dem persistenten Cache,
+    nur die übrigen gehen an den Übersetzer. Liefert {Original: Übersetzung} für geänderte Texte.
+    """
+    if not texts_to_translate:
         return {}
-    translation_map = {}
-    try:
-        translator = GoogleTranslator(source='ja', target='de')
-        translated_texts = translator.translate_batch(texts_to_translate)
-        for original, translated in zip(texts_to_translate, translated_texts):
-            if translated and translated.lower() != original.lower():
-                translation_map[original] = translated
-    except Exception:
-        for text in texts_to_translate:
-            try:
-                translator = GoogleTranslator(source='ja', target='de')
-                translated = translator.translate(text)
-                if translated and translated.lower() != text.lower():
-                    translation_map[text] = translated
-            except Exception:
-                pass
-    return translation_map
-
-def process_excel_and_translate(file: UploadFile) -> str:
+    translated = translation_cache.get_many(texts_to_translate, source, target) if translation_cache else {}
+    missing = [text for text in texts_to_translate if text not in translated]
+    if missing and get_translator_backend() is not None:
+        with stage("translation", rows=len(missing)):
+            fresh = translate_chunked(missing, source, target)
+        if translation_cache:
+            translation_cache.put_many(fresh, source, target)
+        translated.update(fresh)
+    return {
+        original: text for original, text in translated.items()
+        if text and text.lower() != original.lower()
+    }
+
+def process_excel_and_translate(file: UploadFile) -> ConversionResult:
     """
-    Nimmt eine Excel-Datei, übersetzt japanische Texte nach Deutsch und gibt den Pfad zur neuen Datei zurück.
+    Nimmt eine Excel-Datei, übersetzt japanische Texte nach Deutsch und gibt das Ergebnis
+    (übersetzte Datei, Anzahl Datenzeilen ohne Header) zurück.
     """
-    # Speichere Upload temporär
-    with NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-        tmp.write(file.file.read())
-        tmp_path = tmp.name
+    return translate_excel_content(file.file.read())
 
-    wb = openpyxl.load_workbook(tmp_path)
-    ws = wb.active
+def translate_excel_content(content: bytes, preserve_formatting: bool = True) -> ConversionResult:
+    """
+    Übersetzt den Inhalt einer Excel-Datei (japanisch → deutsch, alle Arbeitsblätter) im Speicher
+    und liefert die neue Datei. Standardmäßig bleiben Formatierung, verbundene Zellen und
+    Spaltenbreiten erhalten; preserve_formatting=False streamt speichersparend nur die Werte.
+    """
+    started = time.perf_counter()
+    output = io.BytesIO()
+    if preserve_formatting:
+        rows_count = _translate_workbook_in_place(io.BytesIO(content), output)
+    else:
+        rows_count = _translate_workbook_streaming(io.BytesIO(content), output)
+    return ConversionResult.finished(started, output.getvalue(), rows_count)
+
+def _translate_workbook_in_place(source: BinaryIO, output: BinaryIO) -> int:
+    """Bearbeitet die Arbeitsmappe vollständig im Speicher; Formatierung, Formeln usw. bleiben erhalten"""
+    with stage("excel_parse") as timing:
+        wb = openpyxl.load_workbook(source)
 
-    # Sammle alle einzigartigen japanischen Texte
-    unique_japanese_texts = set()
-    for row in ws.iter_rows():
-        for cell in row:
-            if cell.value and has_japanese_characters(str(cell.value)):
-                unique_japanese_texts.add(str(cell.value))
+        # Sammle alle einzigartigen japanischen Texte
+        unique_japanese_texts = collect_japanese_texts(
+            cell.value for ws in wb.worksheets for row in ws.iter_rows() for cell in row
+        )
+        timing.rows = sum(ws.max_row for ws in wb.worksheets)
 
     translation_map = translate_texts(list(unique_japanese_texts)) if unique_japanese_texts else {}
 
-    # Ersetze die Werte durch Übersetzungen
-    for row in ws.iter_rows():
-        for cell in row:
-            if cell.value and str(cell.value) in translation_map:
-                cell.value = translation_map[str(cell.value)]
+    with stage("excel_write") as timing:
+        # Ersetze die Werte durch Übersetzungen
+        for ws in wb.worksheets:
+            for row in ws.iter_rows():
+                for cell in row:
+                    if isinstance(cell.value, str) and cell.value in translation_map:
+                        cell.value = translation_map[cell.value]
+
+        # Speichere die übersetzte Datei
+        wb.save(output)
+        timing.bytes = output.tell()
+    ws = wb.active
+    return ws.max_row - 1 if ws.max_row > 1 else 0
+
+def _translate_workbook_streaming(source_file: BinaryIO, output: BinaryIO) -> int:
+    """
+    Zwei Durchläufe mit konstantem Speicherbedarf: read_only-Durchlauf sammelt die Texte,
+    danach werden die übersetzten Zeilen direkt in eine write_only-Arbeitsmappe geschrieben.
+    Übernommen werden nur Werte (keine Formatierung).
+    """
+    source = openpyxl.load_workbook(source_file, read_only=True)
+    try:
+        with stage("excel_parse"):
+            unique_japanese_texts = collect_japanese_texts(
+                value for ws in source.worksheets for row in ws.iter_rows(values_only=True) for value in row
+            )
+
+        translation_map = translate_texts(list(unique_japanese_texts)) if unique_japanese_texts else {}
+
+        # Zweiter Durchlauf: Lesen und Schreiben der übersetzten Zeilen zusammen gemessen
+        with stage("excel_write") as timing:
+            target = openpyxl.Workbook(write_only=True)
+            active_title = source.active.title if source.active is not None else None
+            rows_count = 0
+            for ws in source.worksheets:
+                target_ws = target.create_sheet(title=ws.title)
+                sheet_rows = 0
+                for row in ws.iter_rows(values_only=True):
+                    target_ws.append([translation_map.get(value, value) if isinstance(value, str) else value for value in row])
+                    sheet_rows += 1
+                timing.rows += sheet_rows
+                if ws.title == active_title:
+                    rows_count = max(sheet_rows - 1, 0)
+            target.save(output)
+            timing.bytes = output.tell()
+        return rows_count
+    finally:
+        source.close()
+
+async def run_excel_translation(
+    content: bytes,
+    email: str,
+    job: Optional[Job] = None,
+    preserve_formatting: bool = True
+) -> dict:
+    """
+    Übersetzt den gelesenen Upload und versendet die übersetzte Datei per E-Mail.
+    Im Job-Modus bleibt die Ausgabedatei für den Download erhalten.
+    """
+    # Übersetzung ist überwiegend Netzwerk-I/O → Thread-Pool
+    result = await run_io(translate_excel_content, content, preserve_formatting)
+    mark_stage(job, "converted")
+    if job is not None:
+        job.output = result.output
+        job.output_filename = OUTPUT_FILENAME
 
-    # Speichere die übersetzte Datei
-    output_path = tmp_path.replace('.xlsx', '_translated.xlsx')
-    wb.save(output_path)
-    return output_path
+    # Abrechnungsmonat ist hier nicht relevant, aber Pflicht für send_email
+    success = await run_io(send_email, email, result.output, "", result.rows_count, attachment_name=OUTPUT_FILENAME)
+    if not success:
+        raise HTTPException(status_code=500, detail="E-Mail-Versand fehlgeschlagen.")
+    mark_stage(job, "emailed")
+    return {
+        "message": f"Übersetzte Excel-Datei erfolgreich an {email} gesendet.",
+        "rows_processed": result.rows_count,
+        "preserve_formatting": preserve_formatting,
+        "duration_seconds": round(result.duration_seconds, 3)
+    }
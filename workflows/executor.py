@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Begrenzte Executor-Schicht, damit blockierende Arbeit nicht den asyncio-Event-Loop anhält:
+- I/O-Pool (Threads) für E-Mail-Versand und Übersetzung
+- CPU-Pool (Prozesse) für das Parsen und Konvertieren von Excel-Dateien
+
+Limits über Umgebungsvariablen:
+- IO_WORKERS (Standard 8)
+- CPU_WORKERS (Standard: Anzahl CPUs, in Serverless-Umgebungen wie Vercel 0; 0 = Konvertierung
+  im I/O-Pool statt in eigenen Prozessen)
+
+Serverless (VERCEL bzw. AWS_LAMBDA_FUNCTION_NAME gesetzt) gibt es keine multiprocessing-Primitiven
+(SemLock), und jeder Kaltstart müsste zusätzlich die Worker-Prozesse starten. Lässt sich der
+Prozess-Pool nicht anlegen, läuft die Konvertierung ebenfalls in Threads.
+
+Stirbt ein Worker-Prozess (z.B. Speichermangel bei einer großen Arbeitsmappe), ist der ganze
+Prozess-Pool unbrauchbar: er wird dann verworfen und der Auftrag einmal in einem neuen Pool wiederholt.
+"""
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from workflows.metrics import METRICS_ENABLED, collect_stages, merge_stages
+
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "0" if SERVERLESS else str(os.cpu_count() or 1)))
+
+
+class BoundedExecutor:
+    """Pool mit fester Worker-Anzahl, der laufende und wartende Aufträge zählt"""
+
+    def __init__(self, name: str, max_workers: int, processes: bool = False):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.processes = processes
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.processes:
+                try:
+                    # "spawn" vermeidet geerbte Locks aus den Threads des Webservers
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                except (ImportError, NotImplementedError, OSError) as e:
+                    print(f"⚠️ Prozess-Pool '{self.name}' nicht verfügbar ({e}), verwende Threads")
+                    self.processes = False
+            if not self.processes:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def _discard_broken(self, executor: Executor) -> None:
+        """Verwirft einen defekten Prozess-Pool (nur einmal, auch wenn mehrere Aufträge betroffen sind)"""
+        if self._executor is executor:
+            print(f"⚠️ Prozess-Pool '{self.name}' defekt (Worker-Prozess beendet), starte neu")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.restarts += 1
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Führt fn im Pool aus und wartet asynchron auf das Ergebnis"""
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            for attempt in range(2):
+                executor = self._get_executor()
+                call = functools.partial(fn, *args, **kwargs)
+                if not self.processes:
+                    # Kontextvariablen (z.B. die Messung der laufenden Anfrage) wie bei asyncio.to_thread mitgeben
+                    call = functools.partial(contextvars.copy_context().run, call)
+                try:
+                    result = await loop.run_in_executor(executor, call)
+                    break
+                except BrokenProcessPool:
+                    self._discard_broken(executor)
+                    if attempt == 1:
+                        raise
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "kind": "process" if self.processes else "thread",
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "saturated": self.in_flight >= self.max_workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+io_executor = BoundedExecutor("io", IO_WORKERS)
+cpu_executor = (
+    BoundedExecutor("cpu", CPU_WORKERS, processes=True) if CPU_WORKERS > 0 else io_executor
+)
+
+
+async def run_io(fn: Callable, *args, **kwargs):
+    """Blockierende I/O (SMTP, Mailgun, Übersetzung) im Thread-Pool ausführen"""
+    return await io_executor.run(fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable, *args, **kwargs):
+    """CPU-lastige Arbeit (Excel parsen/konvertieren) im Prozess-Pool ausführen. fn und Argumente müssen picklebar sein."""
+    if not METRICS_ENABLED:
+        return await cpu_executor.run(fn, *args, **kwargs)
+    # Die im Worker gemessenen Schritte kommen mit dem Ergebnis zurück
+    result, stages = await cpu_executor.run(collect_stages, fn, *args, **kwargs)
+    merge_stages(stages)
+    return result
+
+
+def executor_stats() -> dict:
+    stats = {"io": io_executor.stats()}
+    if cpu_executor is not io_executor:
+        stats["cpu"] = cpu_executor.stats()
+    return stats
+
+
+def shutdown_executors() -> None:
+    io_executor.shutdown()
+    if cpu_executor is not io_executor:
+        cpu_executor.shutdown()
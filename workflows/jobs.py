@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+In-Process-Jobverwaltung für lange Konvertierungen: Der Endpoint nimmt den Upload an,
+gibt sofort eine Job-ID zurück und verarbeitet die Datei im Hintergrund.
+
+Scheitert nach erfolgreicher Konvertierung nur der E-Mail-Versand, erhält der Job den Status
+"converted" mit email_error; die Ausgabedatei bleibt über /jobs/{id}/result abrufbar.
+
+Konfiguration über Umgebungsvariablen:
+- JOB_WORKERS: gleichzeitig laufende Jobs (Standard 2)
+- JOB_TTL_SECONDS: wie lange abgeschlossene Jobs samt Ausgabedatei (im Speicher) abrufbar bleiben (Standard 3600)
+"""
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+
+# Verarbeitungsschritte in Reihenfolge; "converted" umfasst Parsen und Konvertieren im Worker
+JOB_STAGES = ("received", "converted", "emailed")
+
+
+@dataclass
+class Job:
+    id: str
+    workflow: str
+    status: str = "queued"  # queued | running | done | converted (E-Mail fehlgeschlagen) | failed
+    progress: Dict[str, float] = field(default_factory=dict)  # Schritt → Zeitstempel
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    email_error: Optional[str] = None
+    output: Optional[bytes] = None
+    output_filename: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def mark(self, stage: str) -> None:
+        self.progress[stage] = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "workflow": self.workflow,
+            "status": self.status,
+            "progress": {stage: stage in self.progress for stage in JOB_STAGES},
+            "result": self.result,
+            "error": self.error,
+            "email_error": self.email_error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result_url": f"/jobs/{self.id}/result" if self.downloadable else None,
+        }
+
+    @property
+    def downloadable(self) -> bool:
+        return self.status in ("done", "converted") and self.output is not None
+
+    def _fail(self, error: str) -> None:
+        # Ausgabedatei schon vorhanden: nur der Versand ist fehlgeschlagen, das Ergebnis bleibt abrufbar
+        if self.output is not None:
+            self.status = "converted"
+            self.email_error = error
+        else:
+            self.status = "failed"
+            self.error = error
+
+
+def mark_stage(job: Optional[Job], stage: str) -> None:
+    """Markiert einen Verarbeitungsschritt, falls im Job-Modus verarbeitet wird"""
+    if job is not None:
+        job.mark(stage)
+
+
+class JobQueue:
+    """Hält Jobs im Speicher und verarbeitet höchstens `workers` Jobs gleichzeitig"""
+
+    def __init__(self, workers: int = JOB_WORKERS, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.workers = max(1, workers)
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._tasks = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def submit(self, workflow: str, pipeline: Callable[[Job], Awaitable[dict]]) -> Job:
+        """Legt einen Job an und startet die Pipeline im Hintergrund"""
+        self._prune()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+
+        job = Job(id=uuid.uuid4().hex, workflow=workflow)
+        job.mark("received")
+        self._jobs[job.id] = job
+
+        task = asyncio.create_task(self._run(job, pipeline))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Job, pipeline: Callable[[Job], Awaitable[dict]]) -> None:
+        async with self._semaphore:
+            job.status = "running"
+            try:
+                job.result = await pipeline(job)
+                job.status = "done"
+            except HTTPException as e:
+                job._fail(str(e.detail))
+            except Exception as e:
+                print(f"❌ Job {job.id} fehlgeschlagen: {str(e)}")
+                job._fail(str(e))
+            finally:
+                job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        counts = {"queued": 0, "running": 0, "done": 0, "converted": 0, "failed": 0}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, **counts}
+
+    def _prune(self) -> None:
+        """Entfernt abgelaufene Jobs samt Ausgabedateien"""
+        now = time.time()
+        expired = [
+            job for job in self._jobs.values()
+            if job.finished_at is not None and now - job.finished_at > self.ttl_seconds
+        ]
+        for job in expired:
+            del self._jobs[job.id]
+
+
+job_queue = JobQueue()
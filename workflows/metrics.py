@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Messung der Verarbeitungsschritte: Upload lesen, Excel parsen, Monatserkennung, Konvertierung,
+CSV schreiben, Übersetzung, E-Mail-Versand je Transport und Ergebnis-Cache. Jeder Schritt
+erfasst Dauer sowie Bytes bzw. Zeilen.
+
+- /metrics liefert die Summen seit dem Start im Prometheus-Textformat
+  (Histogramm der Dauer, Zähler für Bytes, Zeilen und Fehler je Schritt)
+- jede Antwort erhält einen Server-Timing-Header mit den Schritten dieser Anfrage
+
+Schritte in den Worker-Prozessen (Parsen, Konvertieren) werden dort gesammelt und mit dem
+Ergebnis an den Webserver-Prozess zurückgegeben (siehe run_cpu). Ist die Messung deaktiviert,
+liefert stage() einen gemeinsamen No-op-Kontextmanager, timed() die unveränderte Funktion und
+record_stage() kehrt sofort zurück.
+
+Konfiguration über Umgebungsvariablen:
+- METRICS_ENABLED: Messung aktiv (Standard "1"; "0" = aus)
+"""
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off", "")
+
+# Obergrenzen der Histogramm-Buckets in Sekunden
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+METRIC_PREFIX = "lohnabrechnung"
+
+
+class StageRecord(NamedTuple):
+    """Ein gemessener Schritt (picklebar, damit er aus dem Prozess-Pool zurückgegeben werden kann)"""
+    stage: str
+    seconds: float
+    bytes: int = 0
+    rows: int = 0
+    transport: Optional[str] = None
+    failed: bool = False
+
+
+class StageCollector:
+    """
+    Sammelt die Schritte einer Anfrage (für Server-Timing) bzw. eines Auftrags im Worker-Prozess.
+    deferred=True: die Schritte werden nur gesammelt und erst vom Aufrufer in die Summen übernommen.
+    """
+
+    def __init__(self, deferred: bool = False):
+        self.deferred = deferred
+        self.records: List[StageRecord] = []
+
+    def server_timing(self, total_seconds: Optional[float] = None) -> str:
+        """Server-Timing-Header: Dauer je Schritt in ms, gleiche Schritte zusammengefasst"""
+        durations: Dict[str, float] = {}
+        for record in self.records:
+            name = f"{record.stage}_{record.transport}" if record.transport else record.stage
+            durations[name] = durations.get(name, 0.0) + record.seconds
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()]
+        if total_seconds is not None:
+            entries.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_collector: contextvars.ContextVar[Optional[StageCollector]] = contextvars.ContextVar("stage_collector", default=None)
+
+
+class _Series:
+    __slots__ = ("count", "seconds", "bytes", "rows", "failures", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.rows = 0
+        self.failures = 0
+        self.buckets = [0] * len(STAGE_BUCKETS)
+
+
+class MetricsRegistry:
+    """Summen je (Schritt, Transport) seit dem Start (threadsicher)"""
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, Optional[str]], _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, record: StageRecord) -> None:
+        with self._lock:
+            series = self._series.get((record.stage, record.transport))
+            if series is None:
+                series = self._series[(record.stage, record.transport)] = _Series()
+            series.count += 1
+            series.seconds += record.seconds
+            series.bytes += record.bytes
+            series.rows += record.rows
+            series.failures += record.failed
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if record.seconds <= bound:
+                    series.buckets[i] += 1
+                    break
+
+    def render_prometheus(self) -> str:
+        """Prometheus-Textformat (Version 0.0.4)"""
+        with self._lock:
+            items = sorted(
+                ((key, series.count, series.seconds, series.bytes, series.rows, series.failures, list(series.buckets))
+                 for key, series in self._series.items()),
+                key=lambda item: (item[0][0], item[0][1] or "")
+            )
+
+        duration = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [
+            f"# HELP {duration} Dauer der Verarbeitungsschritte",
+            f"# TYPE {duration} histogram",
+        ]
+        for (stage, transport), count, seconds, _, _, _, buckets in items:
+            labels = _labels(stage, transport)
+            cumulative = 0
+            for bound, n in zip(STAGE_BUCKETS, buckets):
+                cumulative += n
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                lines.append(f'{duration}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{duration}_sum{{{labels}}} {seconds:.6f}")
+            lines.append(f"{duration}_count{{{labels}}} {count}")
+
+        for name, help_text, index in (
+            ("stage_bytes_total", "Verarbeitete Bytes je Schritt", 3),
+            ("stage_rows_total", "Verarbeitete Zeilen je Schritt", 4),
+            ("stage_failures_total", "Fehlgeschlagene Schritte", 5),
+        ):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for item in items:
+                (stage, transport) = item[0]
+                lines.append(f"{metric}{{{_labels(stage, transport)}}} {item[index]}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+def _labels(stage: str, transport: Optional[str]) -> str:
+    labels = f'stage="{stage}"'
+    if transport:
+        labels += f',transport="{transport}"'
+    return labels
+
+
+registry = MetricsRegistry()
+
+
+def _observe(record: StageRecord) -> None:
+    collector = _collector.get()
+    if collector is not None:
+        collector.records.append(record)
+        if collector.deferred:
+            return
+    registry.observe(record)
+
+
+def record_stage(stage: str, seconds: float, bytes: int = 0, rows: int = 0,
+                 transport: Optional[str] = None, failed: bool = False) -> None:
+    """Erfasst einen bereits gemessenen Schritt"""
+    if METRICS_ENABLED:
+        _observe(StageRecord(stage, seconds, bytes, rows, transport, failed))
+
+
+class _Stage:
+    """Misst den umschlossenen Block; bytes/rows/failed können im Block gesetzt werden"""
+    __slots__ = ("stage", "transport", "bytes", "rows", "failed", "_started")
+
+    def __init__(self, stage: str, transport: Optional[str], bytes: int, rows: int):
+        self.stage = stage
+        self.transport = transport
+        self.bytes = bytes
+        self.rows = rows
+        self.failed = False
+
+    def __enter__(self) -> "_Stage":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _observe(StageRecord(
+            self.stage, time.perf_counter() - self._started, self.bytes, self.rows, self.transport,
+            self.failed or exc_type is not None
+        ))
+
+
+class _NoopStage:
+    """Gemeinsamer Ersatz für _Stage bei deaktivierter Messung (Zuweisungen an bytes/rows/failed werden verworfen)"""
+    bytes = 0
+    rows = 0
+    failed = False
+
+    def __setattr__(self, name, value) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopStage":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def stage(name: str, transport: Optional[str] = None, bytes: int = 0, rows: int = 0):
+    """Kontextmanager, der Dauer (und Bytes/Zeilen) eines Schritts erfasst"""
+    if not METRICS_ENABLED:
+        return _NOOP_STAGE
+    return _Stage(name, transport, bytes, rows)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator für Funktionen, die genau einen Schritt ausmachen; ohne Messung unverändert"""
+    def decorate(fn: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TimedIterator:
+    """Zählt die Zeit, die im Erzeugen der Elemente eines Iterators steckt (z.B. Datensätze eines Generators)"""
+
+    def __init__(self, iterable: Iterable):
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+def collect_stages(fn: Callable, /, *args, **kwargs):
+    """Führt fn (im Worker) aus und liefert (Ergebnis, dabei gemessene Schritte)"""
+    collector = StageCollector(deferred=True)
+    token = _collector.set(collector)
+    try:
+        return fn(*args, **kwargs), collector.records
+    finally:
+        _collector.reset(token)
+
+
+def merge_stages(records: List[StageRecord]) -> None:
+    """Übernimmt die in einem Worker gemessenen Schritte in die Summen und die laufende Anfrage"""
+    for record in records:
+        _observe(record)
+
+
+def render_metrics() -> str:
+    return registry.render_prometheus()
+
+
+class ServerTimingMiddleware:
+    """ASGI-Middleware: sammelt die Schritte jeder HTTP-Anfrage und setzt den Server-Timing-Header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        collector = StageCollector()
+        token = _collector.set(collector)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = collector.server_timing(time.perf_counter() - started)
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _collector.reset(token)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Mehrblatt-Konvertierung: Arbeitsmappen mit einem Arbeitsblatt je Abteilung werden in einem
+Durchgang konvertiert. Die Arbeitsmappe wird einmal geöffnet, alle ausgewählten Blätter
+(Liste oder Muster wie "Abt*") daraus gelesen und anschließend parallel in Datensätze
+umgewandelt. Ergebnis ist eine gemeinsame CSV oder ein ZIP mit einer CSV je Blatt.
+
+Fehler eines Blatts (z.B. fehlende Spalten) werden im Bericht je Blatt gemeldet, die übrigen
+Blätter werden trotzdem konvertiert.
+
+Konfiguration über Umgebungsvariablen:
+- MULTI_SHEET_THREADS: gleichzeitig konvertierte Blätter innerhalb eines Uploads (Standard 4)
+"""
+import contextvars
+import fnmatch
+import functools
+import io
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from fastapi import HTTPException
+
+from workflows.csv_output import CsvRecordWriter
+from workflows.email_service import send_email
+from workflows.essensgeld_workflow import essensgeld_records
+from workflows.executor import run_io
+from workflows.jobs import Job, mark_stage
+from workflows.metrics import stage
+from workflows.payroll_converter import PAYROLL_HEADER_ROW, detect_abrechnungsmonat_in_session, payroll_records
+from workflows.pfleger_workflow import pfleger_records
+from workflows.result_cache import convert_cached
+from workflows.results import ConversionResult
+from workflows.workbook_session import WorkbookSession
+
+MULTI_SHEET_THREADS = int(os.getenv("MULTI_SHEET_THREADS", "4"))
+
+# Workflow -> (Parameter für das Einlesen eines Blatts, Datensätze aus dem eingelesenen Blatt)
+SHEET_CONVERTERS: Dict[str, Tuple[dict, Callable[[pd.DataFrame, str, str], Iterator[list]]]] = {
+    "payroll": ({"header": PAYROLL_HEADER_ROW}, payroll_records),
+    "pfleger": ({"header": None}, pfleger_records),
+    "essensgeld": ({}, essensgeld_records),
+}
+SHEET_OUTPUTS = ("combined", "per_sheet")
+
+
+class SheetSelectionError(ValueError):
+    """Keines der angefragten Arbeitsblätter ist in der Arbeitsmappe vorhanden"""
+
+
+def parse_sheet_list(sheets: Optional[str]) -> Optional[List[str]]:
+    """Kommagetrennte Blattnamen aus einem Formularfeld; leer = keine Auswahl"""
+    if not sheets:
+        return None
+    names = [name.strip() for name in sheets.split(",") if name.strip()]
+    return names or None
+
+
+def select_sheets(available: List[str], sheets: Optional[List[str]] = None,
+                  sheet_pattern: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """
+    Wählt die zu konvertierenden Blätter in Reihenfolge der Arbeitsmappe (bzw. der Liste) aus.
+    Liefert (gefundene Blätter, fehlende Blätter der Liste).
+    """
+    if sheets:
+        return [s for s in sheets if s in available], [s for s in sheets if s not in available]
+    pattern = sheet_pattern or "*"
+    return [s for s in available if fnmatch.fnmatchcase(s, pattern)], []
+
+
+def _sheet_filename(sheet_name: str) -> str:
+    return re.sub(r"[^\w\-]+", "_", sheet_name).strip("_") or "blatt"
+
+
+def _convert_sheet(workflow: str, df: pd.DataFrame, mandant: str, abrechnungsmonat: str) -> Tuple[List[list], float]:
+    started = time.perf_counter()
+    with stage("conversion") as timing:
+        records = list(SHEET_CONVERTERS[workflow][1](df, mandant, abrechnungsmonat))
+        timing.rows = len(records)
+    return records, time.perf_counter() - started
+
+
+def _default_abrechnungsmonat(workflow: str, session: WorkbookSession, selected: List[str]) -> str:
+    """Wie die Einzelkonvertierung: Lohnabrechnung aus dem Blattkopf, sonst der aktuelle Monat"""
+    if workflow == "payroll":
+        sheet = "Tabelle1" if "Tabelle1" in session.sheet_names else selected[0]
+        detected = detect_abrechnungsmonat_in_session(session, sheet)
+        if detected:
+            return detected
+        return f"{datetime.now().year}{datetime.now().month:02d}"
+    return pd.Timestamp.today().strftime("%Y%m")
+
+
+def convert_workbook_sheets(content: bytes, workflow: str, mandant: str = "10001",
+                            abrechnungsmonat: Optional[str] = None, sheets: Optional[List[str]] = None,
+                            sheet_pattern: Optional[str] = None, output: str = "combined") -> ConversionResult:
+    """
+    Konvertiert mehrere Blätter einer Arbeitsmappe aus einem einzigen Öffnen der Datei.
+    Nimmt nur picklebare Argumente, damit die Konvertierung im Prozess-Pool laufen kann.
+    """
+    started = time.perf_counter()
+    read_options, _ = SHEET_CONVERTERS[workflow]
+    report: List[dict] = []
+    frames: List[Tuple[str, pd.DataFrame]] = []
+
+    with WorkbookSession(io.BytesIO(content)) as session:
+        selected, missing = select_sheets(session.sheet_names, sheets, sheet_pattern)
+        if not selected:
+            raise SheetSelectionError("Keine passenden Arbeitsblätter gefunden (vorhanden: " + ", ".join(session.sheet_names) + ")")
+        report.extend({"sheet": name, "rows_count": 0, "duration_seconds": 0.0, "error": "Arbeitsblatt nicht gefunden"}
+                      for name in missing)
+        if not abrechnungsmonat:
+            abrechnungsmonat = _default_abrechnungsmonat(workflow, session, selected)
+
+        # Einlesen nacheinander aus derselben Arbeitsmappe (openpyxl ist nicht threadsicher)
+        for name in selected:
+            try:
+                frames.append((name, session.read_sheet(name, **read_options)))
+            except Exception as e:
+                report.append({"sheet": name, "rows_count": 0, "duration_seconds": 0.0, "error": str(e)})
+
+    # Umwandeln der eingelesenen Blätter parallel
+    def convert(frame: Tuple[str, pd.DataFrame]):
+        name, df = frame
+        try:
+            return name, *_convert_sheet(workflow, df, mandant, abrechnungsmonat), None
+        except Exception as e:
+            return name, [], 0.0, str(e) or type(e).__name__
+
+    workers = max(1, min(MULTI_SHEET_THREADS, len(frames)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sheet") as executor:
+        # Je Blatt eine Kopie des Kontexts, damit die Messung der Blätter beim Auftrag ankommt
+        futures = [executor.submit(contextvars.copy_context().run, convert, frame) for frame in frames]
+        converted = [future.result() for future in futures]
+
+    rows_count = 0
+    if output == "per_sheet":
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            used = set()
+            for name, records, _, error in converted:
+                if error is not None or not records:
+                    continue
+                filename, counter = _sheet_filename(name), 2
+                while filename in used:
+                    filename, counter = f"{_sheet_filename(name)}_{counter}", counter + 1
+                used.add(filename)
+                with CsvRecordWriter() as writer:
+                    rows_count += writer.write_many(records)
+                zf.writestr(f"{filename}.csv", writer.getvalue())
+        output_bytes = buffer.getvalue()
+    else:
+        with CsvRecordWriter() as writer:
+            for _, records, _, _ in converted:
+                writer.write_many(records)
+        rows_count = writer.rows_written
+        output_bytes = writer.getvalue()
+
+    for name, records, duration, error in converted:
+        report.append({"sheet": name, "rows_count": len(records), "duration_seconds": round(duration, 3), "error": error})
+    # Bericht in Reihenfolge der Auswahl
+    order = {name: i for i, name in enumerate(sheets or selected)}
+    report.sort(key=lambda entry: order.get(entry["sheet"], len(order)))
+
+    result = ConversionResult.finished(started, output_bytes, rows_count, abrechnungsmonat)
+    result.sheets = report
+    return result
+
+
+def multi_sheet_filename(abrechnungsmonat: str, output: str) -> str:
+    if output == "per_sheet":
+        return f"lohnabrechnung_{abrechnungsmonat}_blaetter.zip"
+    return f"lohnabrechnung_{abrechnungsmonat}.csv"
+
+
+def validate_multi_sheet_request(workflow: str, output: str) -> None:
+    if workflow not in SHEET_CONVERTERS:
+        raise HTTPException(status_code=400, detail=f"Unbekannter Workflow '{workflow}' (erlaubt: {', '.join(SHEET_CONVERTERS)})")
+    if output not in SHEET_OUTPUTS:
+        raise HTTPException(status_code=400, detail=f"Unbekannte Ausgabe '{output}' (erlaubt: {', '.join(SHEET_OUTPUTS)})")
+
+
+async def run_multi_sheet_conversion(
+    content: bytes,
+    email: str,
+    workflow: str = "payroll",
+    mandant: str = "10001",
+    abrechnungsmonat: Optional[str] = None,
+    sheets: Optional[List[str]] = None,
+    sheet_pattern: Optional[str] = None,
+    output: str = "combined",
+    job: Optional[Job] = None,
+    content_hash: Optional[str] = None
+) -> dict:
+    """
+    Konvertiert die ausgewählten Blätter im Prozess-Pool und versendet das Ergebnis per E-Mail.
+    Im Job-Modus bleibt die Ausgabedatei für den Download erhalten.
+    """
+    try:
+        result = await convert_cached(
+            f"{workflow}_sheets", functools.partial(convert_workbook_sheets, workflow=workflow), content,
+            content_hash=content_hash, mandant=mandant, abrechnungsmonat=abrechnungsmonat,
+            sheets=sheets, sheet_pattern=sheet_pattern, output=output
+        )
+    except SheetSelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    mark_stage(job, "converted")
+    if result.rows_count == 0:
+        raise HTTPException(status_code=400, detail={
+            "message": "Keine gültigen Daten in den Arbeitsblättern gefunden",
+            "sheets": result.sheets
+        })
+
+    filename = multi_sheet_filename(result.abrechnungsmonat, output)
+    if job is not None:
+        job.output = result.output
+        job.output_filename = filename
+
+    email_sent = await run_io(send_email, email, result.output, result.abrechnungsmonat, result.rows_count, filename)
+    if email_sent:
+        mark_stage(job, "emailed")
+    return {
+        "message": "Erfolgreich konvertiert",
+        "rows_processed": result.rows_count,
+        "abrechnungsmonat": result.abrechnungsmonat,
+        "email_sent": email_sent,
+        "filename": filename,
+        "sheets": result.sheets,
+        "duration_seconds": round(result.duration_seconds, 3),
+        "cached": result.from_cache
+    }
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Formatierung von Beträgen im deutschen Format (1.234,50) für alle Konverter.
+
+format_number_german formatiert einen einzelnen Wert, format_numbers_german eine ganze Spalte
+auf einmal: Die Ziffern werden mit NumPy direkt als ASCII-Bytes zusammengesetzt statt pro Wert
+f"{num:,.2f}" und drei str.replace aufzurufen. Das Ergebnis ist für jeden Wert identisch zu
+format_number_german (Rundung, negative Werte inkl. "-0,00", NaN/inf, nicht numerische Werte).
+"""
+from typing import Iterable, List
+
+import numpy as np
+
+# Bis zu diesem Betrag in Cent ist x * 100 genau genug, um die Rundung von f"{x:.2f}" nachzubilden
+_MAX_EXACT_CENTS = 2.0 ** 40
+
+_ZERO, _COMMA, _DOT, _MINUS, _NEWLINE = ord("0"), ord(","), ord("."), ord("-"), ord("\n")
+
+
+def format_number_german(val) -> str:
+    """Formatiert Zahlen im deutschen Format"""
+    try:
+        num = float(val)
+        s = f"{num:,.2f}"
+        s = s.replace(",", "X").replace(".", ",").replace("X", ".")
+        return s
+    except Exception:
+        return str(val)
+
+
+def format_numbers_german(values: Iterable) -> List[str]:
+    """
+    Formatiert alle Werte (NumPy-Array, pandas-Spalte oder Liste) im deutschen Format.
+    Ergebnis wie [format_number_german(v) for v in values].
+    """
+    raw = np.asarray(values)
+    if raw.dtype.kind not in "biuf":
+        # z.B. Texte, None oder pd.NA in der Spalte: Einzelwerte wie bisher formatieren
+        return [format_number_german(v) for v in raw.ravel().tolist()]
+    arr = raw.astype(float, copy=False).ravel()
+    n = len(arr)
+    if n == 0:
+        return []
+
+    # Betrag in Cent. Liegt x * 100 (fast) genau auf ,5, entscheidet der exakte Binärwert von x
+    # über die Rundung – diese Werte sowie NaN/inf und sehr große Beträge formatiert Python selbst.
+    scaled = arr * 100
+    with np.errstate(invalid="ignore"):
+        frac = np.abs(scaled - np.trunc(scaled))
+        fast = (
+            np.isfinite(arr)
+            & (np.abs(scaled) < _MAX_EXACT_CENTS)
+            & (np.abs(frac - 0.5) > np.maximum(np.abs(scaled) * 2.0 ** -50, 1e-9))
+        )
+    cents = np.abs(np.rint(np.where(fast, scaled, 0))).astype(np.int64)
+    euros, cent_digits = np.divmod(cents, 100)
+    # f"{-0.001:.2f}" == "-0.00": das Vorzeichen kommt vom Wert, nicht vom gerundeten Betrag
+    negative = np.signbit(arr) & fast
+
+    # Stellen vor dem Komma, daraus die Länge jedes Texts (Tausenderpunkte, ",00", Vorzeichen)
+    n_digits = np.ones(n, dtype=np.int64)
+    limit = 10
+    while True:
+        more = euros >= limit
+        if not more.any():
+            break
+        n_digits += more
+        limit *= 10
+    lengths = n_digits + (n_digits - 1) // 3 + 3 + negative
+
+    # Alle Texte hintereinander in einen Byte-Puffer, getrennt durch Zeilenumbrüche;
+    # die letzte Stelle nimmt Zeichen auf, die für eine Zeile nicht geschrieben werden.
+    starts = np.zeros(n, dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    total = int(starts[-1] + lengths[-1])
+    buf = np.full(total + 1, _NEWLINE, dtype=np.uint8)
+    sink = total
+    end = starts + lengths - 1
+
+    buf[end] = _ZERO + cent_digits % 10
+    buf[end - 1] = _ZERO + cent_digits // 10
+    buf[end - 2] = _COMMA
+    rest = euros
+    for d in range(int(n_digits.max())):
+        pos = end - 3 - d - d // 3
+        present = d < n_digits
+        buf[np.where(present, pos, sink)] = _ZERO + rest % 10
+        if d and d % 3 == 0:
+            buf[np.where(present, pos + 1, sink)] = _DOT
+        rest = rest // 10
+    buf[np.where(negative, starts, sink)] = _MINUS
+
+    formatted = buf[:total].tobytes().decode("ascii").split("\n")
+    for i in np.flatnonzero(~fast).tolist():
+        formatted[i] = format_number_german(arr[i])
+    return formatted
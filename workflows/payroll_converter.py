@@ -1,19 +1,34 @@
 #!/usr/bin/env python3
-import tempfile
+import time
 import os
 import math
 import re
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Optional, Tuple
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+from typing import Dict, Iterator, List, NamedTuple, Optional
+from workflows.csv_output import CsvRecordWriter
+from workflows.metrics import timed
+from workflows.number_format import format_number_german, format_numbers_german
+from workflows.results import ConversionResult
+from workflows.workbook_session import WorkbookSession
 
 def detect_abrechnungsmonat(file_path: str) -> Optional[str]:
     """Erkennt den Abrechnungsmonat aus der Excel-Datei"""
     try:
-        raw = pd.read_excel(file_path, sheet_name="Tabelle1", header=None)
-        for r in range(min(3, raw.shape[0])):
-            for c in range(raw.shape[1]):
-                v = raw.iloc[r, c]
+        with WorkbookSession(file_path) as session:
+            return detect_abrechnungsmonat_in_session(session)
+    except Exception as e:
+        print(f"Fehler beim Erkennen des Abrechnungsmonats: {str(e)}")
+    return None
+
+@timed("month_detection")
+def detect_abrechnungsmonat_in_session(session: WorkbookSession, sheet_name: str = "Tabelle1") -> Optional[str]:
+    """Erkennt den Abrechnungsmonat aus den ersten drei Zeilen eines Arbeitsblatts einer geöffneten Arbeitsmappe"""
+    try:
+        for row in session.head_rows(sheet_name, 3):
+            for v in row:
                 if pd.isna(v):
                     continue
                 if isinstance(v, (pd.Timestamp, datetime)):
@@ -31,34 +46,40 @@ def is_number(val) -> bool:
     """Prüft ob ein Wert eine Nummer ist"""
     return isinstance(val, (int, float)) and not (isinstance(val, float) and math.isnan(val))
 
-def format_number_german(val) -> str:
-    """Formatiert Zahlen im deutschen Format"""
+
+# Konvertierungs-Engine: "vectorized" (spaltenweise) oder "legacy" (zeilenweise, ursprünglicher Algorithmus)
+PAYROLL_ENGINE = os.getenv("PAYROLL_ENGINE", "vectorized")
+PAYROLL_ENGINES = ("vectorized", "legacy")
+
+# Kopfzeilen oberhalb der Lohnart-Tabelle (pd.read_excel(header=3))
+PAYROLL_HEADER_ROW = 3
+
+# Reihenfolge, in der die Nachbarspalten einer Lohnart nach Betrag/Einheit durchsucht werden
+NEIGHBOUR_OFFSETS = [1, -1, 2, -2, 3, -3]
+
+STD_KEYWORDS = ("stunden", "urlaubs", "krankheit")
+
+
+def format_personalnummer(val) -> str:
+    """Formatiert die Personalnummer (ganzzahlige Werte ohne Nachkommastellen)"""
+    if pd.isna(val):
+        return ""
+    if isinstance(val, (int, float)) and float(val).is_integer():
+        return str(int(val))
+    return str(val).strip()
+
+
+def format_lohnart(val) -> str:
+    """Formatiert den Lohnart-Code"""
     try:
-        num = float(val)
-        s = f"{num:,.2f}"  
-        s = s.replace(",", "X").replace(".", ",").replace("X", ".")
-        return s
+        return str(int(float(val)))
     except Exception:
-        return str(val)
-
-def convert_excel_to_csv(input_file_path: str, mandant: str, abrechnungsmonat: Optional[str], sheet_name: str) -> Tuple[str, int, str]:
-    """Konvertiert Excel zu CSV"""
-    # Abrechnungsmonat ermitteln
-    if abrechnungsmonat is None:
-        abrechnungsmonat = detect_abrechnungsmonat(input_file_path)
-    if not abrechnungsmonat:
-        abrechnungsmonat = f"{datetime.now().year}{datetime.now().month:02d}"
-
-    # Excel einlesen
-    df = pd.read_excel(input_file_path, sheet_name=sheet_name, header=3)
-    header_row = df.iloc[0].astype(str).fillna("")
-    data = df.iloc[1:].reset_index(drop=True).copy()
+        return str(val).strip()
 
-    # Lohnart-Spalten finden
-    lohnart_cols = [i for i, h in enumerate(header_row) if str(h).strip().lower() == "lohnart"]
 
-    rows_out = []
-    
+def _convert_rows_legacy(data: pd.DataFrame, header_row: pd.Series, lohnart_cols: List[int],
+                         mandant: str, abrechnungsmonat: str) -> Iterator[list]:
+    """Ursprüngliche zeilenweise Konvertierung (Referenz-Implementierung)"""
     for ridx in range(len(data)):
         row = data.iloc[ridx]
         
@@ -107,7 +128,7 @@ def convert_excel_to_csv(input_file_path: str, mandant: str, abrechnungsmonat: O
                 if pd.isna(val):
                     continue
                 
-                hdr = str(header_row[j]).strip().lower()
+                hdr = str(header_row.iloc[j]).strip().lower()
 
                 # Stunden-Erkennung
                 if isinstance(val, str) and val.strip().lower() == "h":
@@ -147,20 +168,201 @@ def convert_excel_to_csv(input_file_path: str, mandant: str, abrechnungsmonat: O
                     einheit = "EUR"
                     break
 
-            rows_out.append([mandant, personalnummer, abrechnungsmonat, lohnart, betrag, einheit, kostenstelle])
-
-    # DataFrame erstellen
-    out_df = pd.DataFrame(
-        rows_out,
-        columns=["Mandant", "Personalnummer", "Abrechnungsmonat", "Lohnart", "Betrag", "Einheit", "Kostenstelle"],
-    )
-    out_df = out_df[(out_df["Betrag"].astype(str).str.strip() != "") & (out_df["Einheit"].astype(str).str.strip() != "")]
-
-    # CSV schreiben
-    output_file = tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, encoding='utf-8')
-    output_file_path = output_file.name
-    output_file.close()
-    
-    out_df.to_csv(output_file_path, sep=";", index=False, encoding="utf-8")
-    
-    return output_file_path, len(out_df), abrechnungsmonat
+            # Datensätze ohne Betrag oder Einheit werden nicht ausgegeben
+            if str(betrag).strip() == "" or str(einheit).strip() == "":
+                continue
+            yield [mandant, personalnummer, abrechnungsmonat, lohnart, betrag, einheit, kostenstelle]
+
+
+class ColumnLayout(NamedTuple):
+    """Einmal pro Spaltenlayout aufgelöste Zuordnung Lohnart → Betrag/Einheit"""
+    n_cols: int
+    lohnart_cols: List[int]
+    candidates: Dict[int, List[int]]  # Lohnart-Spalte → Nachbarspalten in Suchreihenfolge
+    einheiten: List[str]  # Einheit je Spalte anhand der Kopfzeile
+
+
+def resolve_column_layout(header_row: pd.Series) -> ColumnLayout:
+    """Löst die Lohnart-Spalten und ihre Nachbarspalten anhand der Kopfzeile auf"""
+    headers = [str(h).strip().lower() for h in header_row]
+    n_cols = len(headers)
+    lohnart_cols = [i for i, h in enumerate(headers) if h == "lohnart"]
+    lohnart_set = set(lohnart_cols)
+    candidates = {
+        i: [i + off for off in NEIGHBOUR_OFFSETS if 0 <= i + off < n_cols and i + off not in lohnart_set]
+        for i in lohnart_cols
+    }
+    einheiten = ["STD" if any(k in h for k in STD_KEYWORDS) else "EUR" for h in headers]
+    return ColumnLayout(n_cols, lohnart_cols, candidates, einheiten)
+
+
+_is_number_ufunc = np.frompyfunc(is_number, 1, 1)
+_is_hours_marker_ufunc = np.frompyfunc(lambda v: isinstance(v, str) and v.strip().lower() == "h", 1, 1)
+
+
+class _ColumnArrays:
+    """Spaltenweise Klassifikation aller Zellen einer Spalte (einmal pro Spalte berechnet)"""
+
+    def __init__(self, col: pd.Series):
+        n = len(col)
+        self.objects = col.to_numpy(dtype=object)
+        self.na = pd.isna(self.objects)
+        if is_numeric_dtype(col.dtype) and not is_bool_dtype(col.dtype):
+            self.is_number = ~self.na
+            self.values = col.to_numpy(dtype=float, na_value=np.nan)
+            self.is_hours_marker = np.zeros(n, dtype=bool)
+        else:
+            self.is_number = _is_number_ufunc(self.objects).astype(bool) if n else np.zeros(0, dtype=bool)
+            self.values = np.full(n, np.nan)
+            self.values[self.is_number] = self.objects[self.is_number].astype(float)
+            self.is_hours_marker = (
+                _is_hours_marker_ufunc(self.objects).astype(bool) if n else np.zeros(0, dtype=bool)
+            )
+        with np.errstate(invalid="ignore"):
+            self.is_integer = np.isfinite(self.values) & (self.values == np.trunc(self.values))
+
+
+def _convert_rows_vectorized(data: pd.DataFrame, header_row: pd.Series, mandant: str,
+                             abrechnungsmonat: str) -> Iterator[list]:
+    """Spaltenweise Konvertierung: Betrag/Einheit werden für alle Zeilen gleichzeitig ermittelt"""
+    layout = resolve_column_layout(header_row)
+    n_rows = len(data)
+    if n_rows == 0 or not layout.lohnart_cols:
+        return
+
+    # Personalnummer und Kostenstelle aus den ursprünglichen Zellwerten formatieren: infer_objects
+    # macht aus einer ganzzahligen Spalte mit leeren Zellen float64 (4711 -> "4711.0")
+    original = data
+    data = data.infer_objects()
+    columns: Dict[int, _ColumnArrays] = {}
+
+    def column(j: int) -> _ColumnArrays:
+        if j not in columns:
+            columns[j] = _ColumnArrays(data.iloc[:, j])
+        return columns[j]
+
+    # Lohnart-Codes je Zeile (entspricht row_lohn_codes)
+    codes = np.column_stack([
+        np.where(column(i).is_number & column(i).is_integer, column(i).values, np.nan)
+        for i in layout.lohnart_cols
+    ])
+
+    def in_row_codes(values: np.ndarray) -> np.ndarray:
+        return (codes == values[:, None]).any(axis=1)
+
+    # Zahlen, die als Betrag in Frage kommen (ganzzahlige Lohnart-Codes der Zeile ausgenommen)
+    amount_ok: Dict[int, np.ndarray] = {}
+    # Zahlen neben einem "h"-Marker (int(wert) darf kein Lohnart-Code der Zeile sein)
+    hours_ok: Dict[int, np.ndarray] = {}
+
+    def amount_mask(j: int) -> np.ndarray:
+        if j not in amount_ok:
+            c = column(j)
+            amount_ok[j] = c.is_number & ~(c.is_integer & in_row_codes(c.values))
+        return amount_ok[j]
+
+    def hours_mask(j: int) -> np.ndarray:
+        if j not in hours_ok:
+            c = column(j)
+            with np.errstate(invalid="ignore"):
+                hours_ok[j] = c.is_number & ~in_row_codes(np.trunc(c.values))
+        return hours_ok[j]
+
+    n_lohnarten = len(layout.lohnart_cols)
+    found = np.zeros((n_rows, n_lohnarten), dtype=bool)
+    betraege = np.full((n_rows, n_lohnarten), np.nan)
+    einheiten = np.full((n_rows, n_lohnarten), "", dtype=object)
+
+    for k, i in enumerate(layout.lohnart_cols):
+        decided = np.zeros(n_rows, dtype=bool)
+        betrag = betraege[:, k]
+        einheit = einheiten[:, k]
+
+        for j in layout.candidates[i]:
+            c = column(j)
+
+            # Stunden-Erkennung: Zahl links, sonst rechts vom "h"-Marker
+            marker = c.is_hours_marker & ~decided
+            if marker.any():
+                for side in (j - 1, j + 1):
+                    if not 0 <= side < layout.n_cols:
+                        continue
+                    take = marker & hours_mask(side)
+                    betrag[take] = column(side).values[take]
+                    einheit[take] = "STD"
+                    decided |= take
+                    marker &= ~take
+
+            take = amount_mask(j) & ~decided
+            betrag[take] = c.values[take]
+            einheit[take] = layout.einheiten[j]
+            decided |= take
+
+        found[:, k] = decided & ~column(i).na
+
+    # Ausgabe in Zeilenreihenfolge, innerhalb einer Zeile in Spaltenreihenfolge
+    row_idx, lohn_idx = np.nonzero(found)
+    if len(row_idx) == 0:
+        return
+
+    personalnummern = [format_personalnummer(v) for v in original.iloc[:, 0].to_numpy(dtype=object)]
+    kostenstellen = ["" if pd.isna(v) else str(v).strip() for v in original.iloc[:, 1].to_numpy(dtype=object)]
+    lohn_objects = np.column_stack([column(i).objects for i in layout.lohnart_cols])
+    # Beträge aller Datensätze in einem Schritt formatieren
+    formatted = format_numbers_german(betraege[row_idx, lohn_idx])
+
+    for r, k, betrag in zip(row_idx.tolist(), lohn_idx.tolist(), formatted):
+        yield [
+            mandant,
+            personalnummern[r],
+            abrechnungsmonat,
+            format_lohnart(lohn_objects[r, k]),
+            betrag,
+            einheiten[r, k],
+            kostenstellen[r],
+        ]
+
+
+def payroll_records(df: pd.DataFrame, mandant: str, abrechnungsmonat: str,
+                    engine: Optional[str] = None) -> Iterator[list]:
+    """Datensätze eines eingelesenen Arbeitsblatts (DataFrame mit header=PAYROLL_HEADER_ROW)"""
+    engine = engine or PAYROLL_ENGINE
+    if engine not in PAYROLL_ENGINES:
+        raise ValueError(f"Unbekannte Konvertierungs-Engine: {engine}")
+
+    header_row = df.iloc[0].astype(str).fillna("")
+    data = df.iloc[1:].reset_index(drop=True).copy()
+
+    if engine == "legacy":
+        # Lohnart-Spalten finden
+        lohnart_cols = [i for i, h in enumerate(header_row) if str(h).strip().lower() == "lohnart"]
+        return _convert_rows_legacy(data, header_row, lohnart_cols, mandant, abrechnungsmonat)
+    return _convert_rows_vectorized(data, header_row, mandant, abrechnungsmonat)
+
+
+def convert_excel_to_csv(source, mandant: str, abrechnungsmonat: Optional[str], sheet_name: str,
+                         engine: Optional[str] = None) -> ConversionResult:
+    """Konvertiert Excel (Pfad oder Datei-Objekt, z.B. BytesIO) zu CSV im Speicher"""
+    started = time.perf_counter()
+    engine = engine or PAYROLL_ENGINE
+    if engine not in PAYROLL_ENGINES:
+        raise ValueError(f"Unbekannte Konvertierungs-Engine: {engine}")
+
+    # Arbeitsmappe nur einmal öffnen: Monatserkennung und DataFrame aus demselben Parse
+    with WorkbookSession(source) as session:
+        # Abrechnungsmonat ermitteln
+        if abrechnungsmonat is None:
+            abrechnungsmonat = detect_abrechnungsmonat_in_session(session)
+        if not abrechnungsmonat:
+            abrechnungsmonat = f"{datetime.now().year}{datetime.now().month:02d}"
+
+        # Excel einlesen
+        df = session.read_sheet(sheet_name, header=PAYROLL_HEADER_ROW)
+
+    records = payroll_records(df, mandant, abrechnungsmonat, engine)
+
+    # CSV schreiben (Datensätze werden direkt beim Erzeugen geschrieben)
+    with CsvRecordWriter() as writer:
+        rows_count = writer.write_many(records)
+
+    return ConversionResult.finished(started, writer.getvalue(), rows_count, abrechnungsmonat)
@@ -1,10 +1,37 @@
 #!/usr/bin/env python3
 from fastapi import UploadFile, File, Form, HTTPException
-import tempfile
-import os
+import io
 from typing import Optional
 from workflows.payroll_converter import convert_excel_to_csv
 from workflows.email_service import send_email
+from workflows.executor import run_io
+from workflows.jobs import Job, mark_stage
+from workflows.result_cache import convert_cached
+from workflows.results import ConversionResult
+from workflows.uploads import UploadContent, read_upload
+
+def validate_payroll_request(file: UploadFile, email: str) -> None:
+    """Prüft Dateiname und E-Mail-Adresse einer Lohnabrechnungs-Anfrage"""
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Keine Datei ausgewählt")
+    
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Nur Excel-Dateien (.xlsx, .xls) sind erlaubt")
+    
+    if not email or "@" not in email:
+        raise HTTPException(status_code=400, detail="Gültige E-Mail-Adresse erforderlich")
+
+async def read_payroll_upload(file: UploadFile, email: str) -> UploadContent:
+    """Validiert die Anfrage und liest den Upload (blockweise, mit Größen- und Typprüfung)"""
+    validate_payroll_request(file, email)
+    return await read_upload(file)
+
+def convert_payroll_content(content: bytes, mandant: str, abrechnungsmonat: Optional[str], sheet_name: str) -> ConversionResult:
+    """
+    Konvertiert den Inhalt einer Lohnabrechnungs-Datei direkt aus dem Speicher. Nimmt nur
+    picklebare Argumente, damit die Konvertierung im Prozess-Pool laufen kann.
+    """
+    return convert_excel_to_csv(io.BytesIO(content), mandant, abrechnungsmonat, sheet_name)
 
 async def process_payroll_conversion(
     file: UploadFile,
@@ -16,46 +43,61 @@ async def process_payroll_conversion(
     """
     Hauptfunktion für die Lohnabrechnung-Konvertierung
     """
-    # Validierungen
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="Keine Datei ausgewählt")
-    
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Nur Excel-Dateien (.xlsx, .xls) sind erlaubt")
-    
-    if not email or "@" not in email:
-        raise HTTPException(status_code=400, detail="Gültige E-Mail-Adresse erforderlich")
-    
-    # Temporäre Datei erstellen
-    input_file = tempfile.NamedTemporaryFile(mode='wb', suffix='.xlsx', delete=False)
-    output_file_path = None
-    
     try:
-        # Datei speichern
-        content = await file.read()
-        if len(content) == 0:
-            raise HTTPException(status_code=400, detail="Datei ist leer")
-        
-        input_file.write(content)
-        input_file.close()
-        
+        upload = await read_payroll_upload(file, email)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Unerwarteter Fehler: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Fehler bei der Verarbeitung: {str(e)}")
+
+    return await run_payroll_conversion(
+        upload.content, email, mandant, abrechnungsmonat, sheet_name, content_hash=upload.sha256
+    )
+
+async def run_payroll_conversion(
+    content: bytes,
+    email: str,
+    mandant: str = "10001",
+    abrechnungsmonat: Optional[str] = None,
+    sheet_name: str = "Tabelle1",
+    job: Optional[Job] = None,
+    content_hash: Optional[str] = None
+) -> dict:
+    """
+    Konvertiert den gelesenen Upload und versendet das Ergebnis. Im Job-Modus bleibt
+    die CSV-Datei für den Download erhalten.
+    """
+    try:
         # Konvertieren
-        output_file_path, rows_count, detected_abrechnungsmonat = convert_excel_to_csv(
-            input_file.name, mandant, abrechnungsmonat, sheet_name
+        result = await convert_cached(
+            "payroll", convert_payroll_content, content, content_hash=content_hash,
+            mandant=mandant, abrechnungsmonat=abrechnungsmonat, sheet_name=sheet_name
         )
+        rows_count = result.rows_count
+        detected_abrechnungsmonat = result.abrechnungsmonat
+        mark_stage(job, "converted")
         
         if rows_count == 0:
             raise HTTPException(status_code=400, detail="Keine gültigen Daten in der Excel-Datei gefunden")
         
         # E-Mail senden
-        email_sent = send_email(email, output_file_path, detected_abrechnungsmonat, rows_count)
+        email_sent = await run_io(send_email, email, result.output, detected_abrechnungsmonat, rows_count)
+        if email_sent:
+            mark_stage(job, "emailed")
+        
+        if job is not None:
+            job.output = result.output
+            job.output_filename = f"lohnabrechnung_{detected_abrechnungsmonat}.csv"
         
         return {
             "message": "Erfolgreich konvertiert",
             "rows_processed": rows_count,
             "abrechnungsmonat": detected_abrechnungsmonat,
             "email_sent": email_sent,
-            "filename": f"lohnabrechnung_{detected_abrechnungsmonat}.csv"
+            "filename": f"lohnabrechnung_{detected_abrechnungsmonat}.csv",
+            "duration_seconds": round(result.duration_seconds, 3),
+            "cached": result.from_cache
         }
         
     except HTTPException:
@@ -63,13 +105,3 @@ async def process_payroll_conversion(
     except Exception as e:
         print(f"Unerwarteter Fehler: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Fehler bei der Verarbeitung: {str(e)}")
-    
-    finally:
-        # Aufräumen
-        try:
-            if os.path.exists(input_file.name):
-                os.unlink(input_file.name)
-            if output_file_path and os.path.exists(output_file_path):
-                os.unlink(output_file_path)
-        except Exception as e:
-            print(f"Fehler beim Aufräumen: {str(e)}")
@@ -1,32 +1,74 @@
+import io
+import numpy as np
 import pandas as pd
 import re
-from fastapi import UploadFile
-from tempfile import NamedTemporaryFile
+import time
+from fastapi import HTTPException, UploadFile
+from typing import Iterator, List, Optional, Tuple
+from workflows.csv_output import CsvRecordWriter
+from workflows.email_service import send_email
+from workflows.executor import run_io
+from workflows.jobs import Job, mark_stage
+from workflows.metrics import stage
+from workflows.number_format import format_number_german, format_numbers_german
+from workflows.result_cache import convert_cached
+from workflows.results import ConversionResult
 import os
 
-def convert_pfleger_from_upload(file: UploadFile, mandant="10001", abrechnungsmonat=None) -> str:
+# Konvertierungs-Engine: "vectorized" (spaltenweise) oder "legacy" (zeilenweise, ursprünglicher Algorithmus)
+PFLEGER_ENGINE = os.getenv("PFLEGER_ENGINE", "vectorized")
+PFLEGER_ENGINES = ("vectorized", "legacy")
+
+# Ab dieser Spalte stehen Lohnarten (Zeile 2 = Lohnart-Code), die ersten beiden davon in Stunden
+FIRST_LOHNART_COLUMN = 4
+STD_COLUMNS = (4, 5)
+
+def convert_pfleger_from_upload(file: UploadFile, mandant="10001", abrechnungsmonat=None) -> ConversionResult:
     """
-    Nimmt eine Excel-Datei (UploadFile), konvertiert sie ins gewünschte Format und gibt den Pfad zur Ausgabedatei zurück.
+    Nimmt eine Excel-Datei (UploadFile), konvertiert sie ins gewünschte Format und gibt das Ergebnis
+    (CSV-Inhalt im Speicher, Zeilenanzahl, Abrechnungsmonat) als ConversionResult zurück.
     """
-    # Speichere Upload temporär
-    with NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-        tmp.write(file.file.read())
-        tmp_path = tmp.name
+    return convert_pfleger_content(file.file.read(), mandant, abrechnungsmonat)
 
+def convert_pfleger_content(content: bytes, mandant="10001", abrechnungsmonat=None,
+                            sheet_name="Tabelle1") -> ConversionResult:
+    """
+    Konvertiert den Inhalt einer Pflegeheim-Excel-Datei. Nimmt nur picklebare Argumente,
+    damit die Konvertierung im Prozess-Pool laufen kann.
+    """
+    started = time.perf_counter()
     if not abrechnungsmonat:
         abrechnungsmonat = pd.Timestamp.today().strftime("%Y%m")
 
-    df = pd.read_excel(tmp_path, sheet_name="Tabelle1", header=None)
-    lohnarts = df.iloc[1].astype(str).fillna("")
+    with stage("excel_parse", bytes=len(content)) as timing:
+        df = pd.read_excel(io.BytesIO(content), sheet_name=sheet_name, header=None)
+        timing.rows = len(df)
+
+    # Ausgabe direkt im Speicher schreiben (wird als E-Mail-Anhang versendet)
+    with CsvRecordWriter() as writer:
+        writer.write_many(pfleger_records(df, mandant, abrechnungsmonat))
+    return ConversionResult.finished(started, writer.getvalue(), writer.rows_written, abrechnungsmonat)
+
+def pfleger_records(df: pd.DataFrame, mandant: str, abrechnungsmonat: str,
+                    engine: Optional[str] = None) -> Iterator[list]:
+    """Datensätze eines eingelesenen Pflegeheim-Arbeitsblatts (DataFrame mit header=None)"""
+    engine = engine or PFLEGER_ENGINE
+    if engine not in PFLEGER_ENGINES:
+        raise ValueError(f"Unbekannte Konvertierungs-Engine: {engine}")
+    if engine == "legacy":
+        return _pfleger_records_legacy(df, mandant, abrechnungsmonat)
+    return _pfleger_records_vectorized(df, mandant, abrechnungsmonat)
 
-    rows_out = []
+def _pfleger_records_legacy(df: pd.DataFrame, mandant: str, abrechnungsmonat: str) -> Iterator[list]:
+    """Ursprüngliche zeilenweise Konvertierung (Referenz-Implementierung)"""
+    lohnarts = df.iloc[1].astype(str).fillna("")
     for ridx in range(2, len(df)):
         personalnummer = df.iloc[ridx, 0]
         kostenstelle = df.iloc[ridx, 3] if df.shape[1] > 3 else ""
         if pd.isna(personalnummer):
             continue
         for c in range(4, df.shape[1]):
-            lohn_code = lohnarts[c]
+            lohn_code = lohnarts.iloc[c]
             lohnart = re.sub(r"\D", "", str(lohn_code))
             if lohnart == "":
                 continue
@@ -42,9 +84,9 @@ def convert_pfleger_from_upload(file: UploadFile, mandant="10001", abrechnungsmo
                     continue
             else:
                 continue
-            betrag = f"{num_val:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+            betrag = format_number_german(num_val)
             einheit = "STD" if c in (4, 5) else "EUR"
-            rows_out.append([
+            yield [
                 mandant,
                 str(int(personalnummer)),
                 abrechnungsmonat,
@@ -52,10 +94,118 @@ def convert_pfleger_from_upload(file: UploadFile, mandant="10001", abrechnungsmo
                 betrag,
                 einheit,
                 "" if pd.isna(kostenstelle) else str(kostenstelle)
-            ])
-    out_df = pd.DataFrame(rows_out, columns=[
-        "Mandant","Personalnummer","Abrechnungsmonat","Lohnart","Betrag","Einheit","Kostenstelle"
-    ])
-    output_path = tmp_path.replace('.xlsx', '_pfleger.txt')
-    out_df.to_csv(output_path, sep=";", index=False, encoding="utf-8")
-    return output_path
+            ]
+
+def resolve_lohnart_columns(df: pd.DataFrame) -> List[Tuple[int, str, str]]:
+    """(Spalte, Lohnart, Einheit) aller Lohnart-Spalten, einmal aus der zweiten Kopfzeile bestimmt"""
+    lohnarts = df.iloc[1].astype(str).fillna("")
+    columns = []
+    for c in range(FIRST_LOHNART_COLUMN, df.shape[1]):
+        lohnart = re.sub(r"\D", "", str(lohnarts.iloc[c]))
+        if lohnart:
+            columns.append((c, lohnart, "STD" if c in STD_COLUMNS else "EUR"))
+    return columns
+
+def _cell_kind(val) -> int:
+    """0 = kein Betrag, 1 = Zahl, 2 = Text (evtl. mit Dezimalkomma)"""
+    if isinstance(val, (int, float)):
+        return 1
+    if isinstance(val, str):
+        return 2
+    return 0
+
+_cell_kind_ufunc = np.frompyfunc(_cell_kind, 1, 1)
+
+def _parse_decimal(text: str) -> Optional[float]:
+    try:
+        return float(text.replace(",", "."))
+    except ValueError:
+        return None
+
+def _pfleger_records_vectorized(df: pd.DataFrame, mandant: str, abrechnungsmonat: str) -> Iterator[list]:
+    """
+    Spaltenweise Konvertierung: Der Datenblock wird ins Langformat (Zeile, Lohnart-Spalte) gebracht,
+    Zahlen und Texte mit Dezimalkomma in einem Schritt umgewandelt und leere bzw. nicht numerische
+    Zellen per Maske verworfen.
+    """
+    columns = resolve_lohnart_columns(df)
+    data = df.iloc[2:]
+    if not columns or data.empty:
+        return
+
+    col_idx = [c for c, _, _ in columns]
+    # Ganzzahl-/Bool-Spalten liefern bei df.iloc NumPy-Skalare, die die bisherige Prüfung
+    # isinstance(val, (int, float)) nicht als Zahl erkennt: wie bisher keine Datensätze
+    skipped = np.array([data.dtypes.iloc[c].kind in "iub" for c in col_idx])
+
+    # Langformat: eine Zelle je (Zeile, Lohnart-Spalte), zeilenweise
+    cells = data.iloc[:, col_idx].to_numpy(dtype=object).ravel()
+    kinds = _cell_kind_ufunc(cells).astype(np.int8) if len(cells) else np.zeros(0, dtype=np.int8)
+    present = ~pd.isna(cells)
+    numbers = present & (kinds == 1)
+    texts = np.flatnonzero(present & (kinds == 2))
+
+    values = np.full(len(cells), np.nan)
+    values[numbers] = cells[numbers].astype(float)
+    valid = numbers
+    if len(texts):
+        # Jeder unterschiedliche Text wird nur einmal umgewandelt
+        parsed = {text: _parse_decimal(text) for text in pd.unique(cells[texts])}
+        converted = [parsed[text] for text in cells[texts]]
+        ok = np.array([v is not None for v in converted])
+        values[texts[ok]] = [v for v in converted if v is not None]
+        valid[texts[ok]] = True
+
+    personalnummern = data.iloc[:, 0].to_numpy(dtype=object)
+    valid = valid.reshape(len(data), len(columns)) & ~skipped & ~pd.isna(personalnummern)[:, None]
+    row_idx, col_pos = np.nonzero(valid)
+    if len(row_idx) == 0:
+        return
+
+    betraege = format_numbers_german(values.reshape(valid.shape)[row_idx, col_pos])
+    kostenstellen = data.iloc[:, 3].to_numpy(dtype=object) if df.shape[1] > 3 else None
+
+    current_row, personalnummer, kostenstelle = -1, "", ""
+    for r, k, betrag in zip(row_idx.tolist(), col_pos.tolist(), betraege):
+        if r != current_row:
+            current_row = r
+            personalnummer = str(int(personalnummern[r]))
+            if kostenstellen is None:
+                kostenstelle = ""
+            else:
+                kostenstelle = "" if pd.isna(kostenstellen[r]) else str(kostenstellen[r])
+        _, lohnart, einheit = columns[k]
+        yield [mandant, personalnummer, abrechnungsmonat, lohnart, betrag, einheit, kostenstelle]
+
+async def run_pfleger_conversion(
+    content: bytes,
+    email: str,
+    mandant="10001",
+    abrechnungsmonat=None,
+    job: Optional[Job] = None,
+    content_hash: Optional[str] = None
+) -> dict:
+    """
+    Konvertiert den gelesenen Upload im Prozess-Pool und versendet das Ergebnis per E-Mail.
+    Im Job-Modus bleibt die Ausgabedatei für den Download erhalten.
+    """
+    result = await convert_cached(
+        "pfleger", convert_pfleger_content, content, content_hash=content_hash,
+        mandant=mandant, abrechnungsmonat=abrechnungsmonat
+    )
+    mark_stage(job, "converted")
+    if job is not None:
+        job.output = result.output
+        job.output_filename = f"lohnabrechnung_{result.abrechnungsmonat}.csv"
+
+    success = await run_io(send_email, email, result.output, result.abrechnungsmonat, result.rows_count)
+    if not success:
+        raise HTTPException(status_code=500, detail="E-Mail-Versand fehlgeschlagen.")
+    mark_stage(job, "emailed")
+    return {
+        "message": f"Pflegeheim-Datei erfolgreich an {email} gesendet.",
+        "rows_processed": result.rows_count,
+        "abrechnungsmonat": result.abrechnungsmonat,
+        "duration_seconds": round(result.duration_seconds, 3),
+        "cached": result.from_cache
+    }
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Ergebnis-Cache für wiederholte Uploads: Wird dieselbe Datei mit denselben Parametern erneut
+konvertiert (Browser-Retry, Versand an weiteren Empfänger), wird die gespeicherte Ausgabedatei
+wiederverwendet statt die Excel-Datei erneut zu parsen.
+
+Schlüssel: SHA-256 des Upload-Inhalts + Workflow + Parameter (Mandant, Abrechnungsmonat, Arbeitsblatt)
++ Konverter-Engines und CONVERTER_VERSION, damit nach einer Korrektur eines Konverters keine alten
+Ausgaben mehr geliefert werden. Ohne Abrechnungsmonat hängt das Ergebnis (Pfleger/Essensgeld) vom
+aktuellen Monat ab, der dann Teil des Schlüssels ist.
+
+Die Ausgaben enthalten Personalnummern und Lohndaten: Das Verzeichnis wird nur für den eigenen
+Benutzer angelegt (0700), die Dateien mit 0600 geschrieben. Gehört ein vorhandenes Verzeichnis
+einem anderen Benutzer, wird der Cache nicht verwendet.
+
+Konfiguration über Umgebungsvariablen:
+- RESULT_CACHE_DIR: Verzeichnis der gespeicherten Ergebnisse (Standard: result_cache im Temp-Verzeichnis;
+  leer = Cache deaktiviert). Serverless (Vercel, AWS Lambda) ist der Cache standardmäßig deaktiviert:
+  das Temp-Verzeichnis ist dort klein, flüchtig und nicht zwischen Instanzen geteilt.
+- RESULT_CACHE_MAX_BYTES: maximale Gesamtgröße, danach werden die am längsten ungenutzten Einträge
+  verdrängt (Standard 200 MB)
+- RESULT_CACHE_TTL_SECONDS: Gültigkeitsdauer eines Eintrags (Standard 86400)
+"""
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+from workflows.executor import SERVERLESS, run_cpu, run_io
+from workflows.metrics import record_stage
+from workflows.results import ConversionResult
+
+RESULT_CACHE_DIR = os.getenv(
+    "RESULT_CACHE_DIR", "" if SERVERLESS else os.path.join(tempfile.gettempdir(), "result_cache")
+)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+
+# Bei jeder Änderung an der Ausgabe eines Konverters erhöhen (macht alle gespeicherten Ergebnisse ungültig)
+CONVERTER_VERSION = 2
+
+
+@functools.lru_cache()
+def converter_tag() -> str:
+    """Version und gewählte Engines der Konverter (Teil jedes Schlüssels)"""
+    # Erst beim ersten Schlüssel importieren: die Workflow-Module importieren ihrerseits diesen Cache
+    from workflows.essensgeld_workflow import ESSENSGELD_ENGINE
+    from workflows.payroll_converter import PAYROLL_ENGINE
+    from workflows.pfleger_workflow import PFLEGER_ENGINE
+    return f"v{CONVERTER_VERSION}/payroll={PAYROLL_ENGINE}/pfleger={PFLEGER_ENGINE}/essensgeld={ESSENSGELD_ENGINE}"
+
+
+def _write_private(path: str, data: bytes) -> None:
+    """Schreibt die Datei atomar und nur für den eigenen Benutzer lesbar (0600)"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class ResultCache:
+    """Größen- und TTL-begrenzter Dateicache für Konvertierungsergebnisse (ein Eintrag = Ausgabedatei + Metadaten)"""
+
+    def __init__(self, directory: str, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 ttl_seconds: int = RESULT_CACHE_TTL_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._directory_ready = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(workflow: str, content_hash: str, params: dict) -> str:
+        params = dict(params)
+        if not params.get("abrechnungsmonat"):
+            params["aktueller_monat"] = time.strftime("%Y%m")
+        payload = json.dumps(
+            {"workflow": workflow, "content": content_hash, "params": params, "converter": converter_tag()},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _ensure_directory(self) -> None:
+        """Legt das Verzeichnis mit 0700 an bzw. stellt 0700 her (nur im eigenen Besitz)"""
+        if self._directory_ready:
+            return
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        if hasattr(os, "getuid") and os.stat(self.directory).st_uid != os.getuid():
+            raise PermissionError(f"Verzeichnis {self.directory} gehört einem anderen Benutzer")
+        os.chmod(self.directory, 0o700)
+        self._directory_ready = True
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + ".out", base + ".json"
+
+    def _read_meta(self, meta_path: str) -> Optional[dict]:
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, key: str) -> None:
+        for path in self._paths(key):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> Optional[ConversionResult]:
+        """Liefert das gespeicherte Ergebnis oder None"""
+        started = time.perf_counter()
+        data_path, meta_path = self._paths(key)
+        with self._lock:
+            try:
+                self._ensure_directory()
+            except OSError as e:
+                print(f"⚠️ Ergebnis-Cache nicht verwendbar: {str(e)}")
+                self.misses += 1
+                return None
+            meta = self._read_meta(meta_path)
+            if meta is None or not os.path.exists(data_path) or time.time() - meta["created_at"] > self.ttl_seconds:
+                if meta is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            with open(data_path, "rb") as f:
+                output = f.read()
+            # Zugriffszeit für die LRU-Verdrängung
+            os.utime(data_path)
+            self.hits += 1
+        record_stage("cache_read", time.perf_counter() - started, bytes=len(output), rows=meta["rows_count"])
+        result = ConversionResult.finished(started, output, meta["rows_count"], meta["abrechnungsmonat"])
+        result.from_cache = True
+        result.sheets = meta.get("sheets")
+        return result
+
+    def put(self, key: str, result: ConversionResult) -> None:
+        started = time.perf_counter()
+        try:
+            size = len(result.output)
+            if size > self.max_bytes:
+                return
+            data_path, meta_path = self._paths(key)
+            with self._lock:
+                self._ensure_directory()
+                _write_private(data_path, result.output)
+                _write_private(meta_path, json.dumps({
+                    "rows_count": result.rows_count,
+                    "abrechnungsmonat": result.abrechnungsmonat,
+                    "sheets": result.sheets,
+                    "size": size,
+                    "created_at": time.time(),
+                }).encode("utf-8"))
+                self.stores += 1
+                self._prune()
+            record_stage("cache_write", time.perf_counter() - started, bytes=size, rows=result.rows_count)
+        except OSError as e:
+            print(f"⚠️ Ergebnis-Cache nicht beschreibbar: {str(e)}")
+
+    def _entries(self):
+        """(key, Metadaten, letzte Nutzung) aller Einträge"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            data_path, meta_path = self._paths(key)
+            meta = self._read_meta(meta_path)
+            try:
+                last_used = os.path.getmtime(data_path)
+            except OSError:
+                last_used = None
+            entries.append((key, meta, last_used))
+        return entries
+
+    def _prune(self) -> None:
+        """Entfernt abgelaufene Einträge und verdrängt danach die am längsten ungenutzten, bis max_bytes eingehalten ist"""
+        now = time.time()
+        alive = []
+        for key, meta, last_used in self._entries():
+            if meta is None or last_used is None or now - meta["created_at"] > self.ttl_seconds:
+                self._remove(key)
+            else:
+                alive.append((last_used, meta["size"], key))
+        total = sum(size for _, size, _ in alive)
+        for _, size, key in sorted(alive):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            try:
+                entries = [(meta or {}).get("size", 0) for _, meta, _ in self._entries()]
+            except OSError:
+                entries = []
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(entries),
+                "bytes": sum(entries),
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+result_cache: Optional[ResultCache] = ResultCache(RESULT_CACHE_DIR) if RESULT_CACHE_DIR else None
+
+
+def result_cache_stats() -> Optional[dict]:
+    return result_cache.stats() if result_cache is not None else None
+
+
+async def convert_cached(workflow: str, convert: Callable[..., ConversionResult], content: bytes,
+                         content_hash: Optional[str] = None, **params) -> ConversionResult:
+    """
+    Konvertiert den Upload im Prozess-Pool, es sei denn, für denselben Inhalt und dieselben Parameter
+    liegt bereits ein Ergebnis vor. content_hash (SHA-256) kann vom Einlesen übernommen werden.
+    """
+    if result_cache is None:
+        return await run_cpu(convert, content, **params)
+
+    key = result_cache.make_key(workflow, content_hash or hashlib.sha256(content).hexdigest(), params)
+    cached = await run_io(result_cache.get, key)
+    if cached is not None:
+        print(f"♻️ Ergebnis aus Cache ({workflow}, {cached.rows_count} Zeilen)")
+        return cached
+
+    result = await run_cpu(convert, content, **params)
+    if result.rows_count > 0:
+        await run_io(result_cache.put, key, result)
+    return result
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass
+class ConversionResult:
+    """Ergebnis einer Konvertierung bzw. Übersetzung (Ausgabedatei im Speicher)"""
+    output: bytes
+    rows_count: int
+    abrechnungsmonat: Optional[str] = None
+    duration_seconds: float = 0.0
+    from_cache: bool = False  # Kopie eines gespeicherten Ergebnisses (siehe result_cache)
+    sheets: Optional[List[dict]] = None  # Bericht je Arbeitsblatt bei Mehrblatt-Konvertierung
+
+    @classmethod
+    def finished(cls, started: float, output: bytes, rows_count: int,
+                 abrechnungsmonat: Optional[str] = None) -> "ConversionResult":
+        """Erstellt das Ergebnis mit der seit `started` (time.perf_counter()) vergangenen Zeit"""
+        return cls(output, rows_count, abrechnungsmonat, time.perf_counter() - started)
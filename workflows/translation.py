@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Übersetzungs-Backend für den Excel-Übersetzungs-Workflow: Texte werden in größenbegrenzte
+Chunks aufgeteilt, die Chunks parallel und ratenbegrenzt übersetzt. Schlägt ein Chunk fehl,
+wird er halbiert und erneut versucht (statt auf eine Anfrage pro Text zurückzufallen). Das gilt
+auch, wenn sich die Antwort den Texten nicht sicher zuordnen lässt: jede Hälfte wird erneut geprüft,
+so entsteht nie eine verschobene Übersetzung (und damit ein falscher Cache-Eintrag).
+
+Das Backend ist austauschbar (set_translator_backend), z.B. für lokale Tests ohne Netzwerk.
+
+Konfiguration über Umgebungsvariablen:
+- TRANSLATION_CHUNK_MAX_TEXTS: maximale Anzahl Texte pro Chunk (Standard 50)
+- TRANSLATION_CHUNK_MAX_CHARS: maximale Zeichenzahl pro Chunk (Standard 4500, Google erlaubt 5000)
+- TRANSLATION_CONCURRENCY: gleichzeitig übersetzte Chunks (Standard 4)
+- TRANSLATION_RATE_PER_SECOND: maximale Anfragen pro Sekunde über alle Uploads (Standard 5; 0 = unbegrenzt)
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Protocol
+
+try:
+    from deep_translator import GoogleTranslator
+    TRANSLATOR_AVAILABLE = True
+except ImportError:
+    TRANSLATOR_AVAILABLE = False
+
+TRANSLATION_CHUNK_MAX_TEXTS = int(os.getenv("TRANSLATION_CHUNK_MAX_TEXTS", "50"))
+TRANSLATION_CHUNK_MAX_CHARS = int(os.getenv("TRANSLATION_CHUNK_MAX_CHARS", "4500"))
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+TRANSLATION_RATE_PER_SECOND = float(os.getenv("TRANSLATION_RATE_PER_SECOND", "5"))
+
+
+class TranslatorBackend(Protocol):
+    def translate_batch(self, texts: List[str], source: str, target: str) -> List[str]:
+        """Übersetzt alle Texte eines Chunks; Ergebnis in gleicher Reihenfolge und Länge"""
+        ...
+
+
+class TranslationMisaligned(ValueError):
+    """Die Antwort lässt sich den Texten nicht sicher zuordnen (Zeilen zusammengefasst oder verloren)"""
+
+
+class GoogleTranslatorBackend:
+    """Google über deep_translator: ein Chunk wird zeilenweise verbunden als eine Anfrage übersetzt"""
+
+    def translate_batch(self, texts: List[str], source: str, target: str) -> List[str]:
+        translator = GoogleTranslator(source=source, target=target)
+        if len(texts) == 1 or any("\n" in text or "\r" in text for text in texts):
+            return translator.translate_batch(texts)
+        translated = translator.translate("\n".join(texts))
+        lines = [line.strip() for line in translated.split("\n")] if translated else []
+        # Eine leere Zeile zu einem nicht leeren Text heißt: Zeilen wurden verschoben
+        if len(lines) != len(texts) or not all(lines):
+            raise TranslationMisaligned(f"Übersetzung lieferte {len(lines)} Zeilen für {len(texts)} Texte")
+        return lines
+
+
+class RateLimiter:
+    """Token-Bucket: höchstens `rate` Anfragen pro Sekunde, kurzzeitig bis zu `burst` auf einmal"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_backend: Optional[TranslatorBackend] = GoogleTranslatorBackend() if TRANSLATOR_AVAILABLE else None
+_rate_limiter = RateLimiter(TRANSLATION_RATE_PER_SECOND)
+
+
+def set_translator_backend(backend: Optional[TranslatorBackend]) -> None:
+    """Ersetzt das Übersetzungs-Backend (None = Übersetzung deaktiviert)"""
+    global _backend
+    _backend = backend
+
+
+def get_translator_backend() -> Optional[TranslatorBackend]:
+    return _backend
+
+
+def chunk_texts(texts: List[str], max_texts: int = TRANSLATION_CHUNK_MAX_TEXTS,
+                max_chars: int = TRANSLATION_CHUNK_MAX_CHARS) -> List[List[str]]:
+    """Teilt die Texte in Chunks mit höchstens max_texts Texten und max_chars Zeichen (überlange Texte einzeln)"""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    chars = 0
+    for text in texts:
+        if current and (len(current) >= max_texts or chars + len(text) + 1 > max_chars):
+            chunks.append(current)
+            current, chars = [], 0
+        current.append(text)
+        chars += len(text) + 1
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _translate_chunk(backend: TranslatorBackend, chunk: List[str], source: str, target: str) -> Dict[str, str]:
+    _rate_limiter.acquire()
+    try:
+        translated = backend.translate_batch(chunk, source, target)
+        if len(translated) != len(chunk):
+            raise TranslationMisaligned(f"Übersetzung lieferte {len(translated)} statt {len(chunk)} Texte")
+    except Exception as e:
+        if len(chunk) == 1:
+            print(f"⚠️ Übersetzung fehlgeschlagen: {str(e)}")
+            return {}
+        # Halbieren statt auf Einzelanfragen zurückzufallen: nur der fehlerhafte Teil wird weiter zerlegt
+        # (auch bei TranslationMisaligned, jede Hälfte wird erneut auf Zeilenzahl und leere Zeilen geprüft)
+        middle = len(chunk) // 2
+        return {
+            **_translate_chunk(backend, chunk[:middle], source, target),
+            **_translate_chunk(backend, chunk[middle:], source, target),
+        }
+    return {original: text for original, text in zip(chunk, translated) if text}
+
+
+def translate_chunked(texts: List[str], source: str = "ja", target: str = "de",
+                      backend: Optional[TranslatorBackend] = None) -> Dict[str, str]:
+    """
+    Übersetzt die Texte chunkweise und parallel. Liefert {Original: Übersetzung} für alle
+    erfolgreich übersetzten Texte (auch unveränderte); ohne Backend ein leeres Dict.
+    """
+    backend = backend or _backend
+    if backend is None or not texts:
+        return {}
+    chunks = chunk_texts(texts)
+    results: Dict[str, str] = {}
+    workers = max(1, min(TRANSLATION_CONCURRENCY, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="translate") as executor:
+        for translated in executor.map(lambda chunk: _translate_chunk(backend, chunk, source, target), chunks):
+            results.update(translated)
+    return results
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Persistentes Übersetzungsgedächtnis: bereits übersetzte Texte werden in einer lokalen
+SQLite-Datenbank gehalten (Schlüssel: Quellsprache, Zielsprache, Text), damit wiederkehrende
+Spaltenköpfe, Produktnamen usw. nicht bei jedem Upload erneut übersetzt werden.
+
+Konfiguration über Umgebungsvariablen:
+- TRANSLATION_CACHE_PATH: Pfad der SQLite-Datei (Standard: translation_cache.sqlite3 im Temp-Verzeichnis;
+  leer = Cache deaktiviert)
+- TRANSLATION_CACHE_MAX_ENTRIES: maximale Anzahl Einträge, danach werden die am längsten
+  ungenutzten verdrängt (Standard 50000)
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+TRANSLATION_CACHE_PATH = os.getenv(
+    "TRANSLATION_CACHE_PATH", os.path.join(tempfile.gettempdir(), "translation_cache.sqlite3")
+)
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "50000"))
+
+# SQLite erlaubt nur eine begrenzte Zahl Parameter pro Anfrage
+_LOOKUP_CHUNK_SIZE = 500
+
+
+class TranslationCache:
+    """SQLite-Übersetzungscache mit LRU-Verdrängung und Treffer-/Fehlzählern (threadsicher)"""
+
+    def __init__(self, path: str, max_entries: int = TRANSLATION_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " source TEXT NOT NULL, target TEXT NOT NULL, text TEXT NOT NULL,"
+                " translated TEXT NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (source, target, text))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, texts: Iterable[str], source: str, target: str) -> Dict[str, str]:
+        """Liefert die bekannten Übersetzungen der Texte und aktualisiert deren Nutzungszeitpunkt"""
+        texts = list(dict.fromkeys(texts))
+        found: Dict[str, str] = {}
+        with self._lock:
+            try:
+                conn = self._connect()
+                for i in range(0, len(texts), _LOOKUP_CHUNK_SIZE):
+                    chunk = texts[i:i + _LOOKUP_CHUNK_SIZE]
+                    placeholders = ",".join("?" * len(chunk))
+                    found.update(conn.execute(
+                        f"SELECT text, translated FROM translations"
+                        f" WHERE source = ? AND target = ? AND text IN ({placeholders})",
+                        (source, target, *chunk),
+                    ))
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE translations SET last_used = ? WHERE source = ? AND target = ? AND text = ?",
+                        [(now, source, target, text) for text in found],
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Übersetzungscache nicht lesbar: {str(e)}")
+                found = {}
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, translations: Dict[str, str], source: str, target: str) -> None:
+        """Speichert neue Übersetzungen und verdrängt bei Bedarf die am längsten ungenutzten Einträge"""
+        if not translations:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations (source, target, text, translated, last_used)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    [(source, target, text, translated, now) for text, translated in translations.items()],
+                )
+                self._evict(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Übersetzungscache nicht beschreibbar: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        count = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM translations WHERE rowid IN"
+                " (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+
+    def stats(self) -> dict:
+        with self._lock:
+            try:
+                entries = self._connect().execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            except sqlite3.Error:
+                entries = None
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+translation_cache: Optional[TranslationCache] = (
+    TranslationCache(TRANSLATION_CACHE_PATH) if TRANSLATION_CACHE_PATH else None
+)
+
+
+def translation_cache_stats() -> Optional[dict]:
+    return translation_cache.stats() if translation_cache is not None else None
+
+
+def close_translation_cache() -> None:
+    if translation_cache is not None:
+        translation_cache.close()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Gemeinsames Einlesen von Uploads für alle Endpoints: Die Datei wird blockweise gelesen,
+dabei gehasht (SHA-256, z.B. für den Ergebnis-Cache) und gegen eine Maximalgröße geprüft.
+Der Dateityp wird anhand der ersten Bytes erkannt, bevor der Rest gelesen wird.
+
+Konfiguration über Umgebungsvariablen:
+- UPLOAD_MAX_BYTES: maximale Upload-Größe (Standard 25 MB)
+- UPLOAD_CHUNK_SIZE: Blockgröße beim Lesen (Standard 1 MB)
+"""
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, UploadFile
+
+from workflows.metrics import record_stage
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Dateisignaturen: .xlsx ist ein ZIP-Archiv, .xls ein OLE2-Compound-Dokument
+FILE_SIGNATURES = {
+    "xlsx": b"PK\x03\x04",
+    "xls": b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",
+}
+EXCEL_FORMATS = ("xlsx", "xls")
+
+
+@dataclass
+class UploadContent:
+    content: bytes
+    sha256: str
+    filename: Optional[str] = None
+    file_format: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+
+def detect_file_format(head: bytes, formats: Sequence[str]) -> Optional[str]:
+    for file_format in formats:
+        if head.startswith(FILE_SIGNATURES[file_format]):
+            return file_format
+    return None
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Datei zu groß (maximal {round(max_bytes / (1024 * 1024), 1):g} MB)")
+
+
+def _wrong_type(formats: Sequence[str]) -> HTTPException:
+    allowed = ", ".join(f".{file_format}" for file_format in formats)
+    return HTTPException(status_code=415, detail=f"Ungültiger Dateityp, erlaubt: {allowed}")
+
+
+async def read_upload(file: UploadFile, formats: Optional[Sequence[str]] = EXCEL_FORMATS,
+                      max_bytes: int = UPLOAD_MAX_BYTES) -> UploadContent:
+    """
+    Liest den Upload blockweise. Zu große Dateien (413) und Dateien mit falscher Signatur (415)
+    werden abgelehnt, sobald das erkennbar ist; formats=None prüft den Dateityp nicht.
+    """
+    started = time.perf_counter()
+    # Bekannte Größe (Content-Length des Teils) vor dem Lesen prüfen
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    signature_length = max((len(FILE_SIGNATURES[f]) for f in formats), default=0) if formats else 0
+    hasher = hashlib.sha256()
+    buffer = bytearray()
+    file_format = None
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > max_bytes:
+            raise _too_large(max_bytes)
+        hasher.update(chunk)
+        buffer += chunk
+        if formats and file_format is None and len(buffer) >= signature_length:
+            file_format = detect_file_format(bytes(buffer[:signature_length]), formats)
+            if file_format is None:
+                raise _wrong_type(formats)
+
+    if not buffer:
+        raise HTTPException(status_code=400, detail="Datei ist leer")
+    if formats and file_format is None:
+        # Datei kürzer als die längste Signatur
+        file_format = detect_file_format(bytes(buffer), formats)
+        if file_format is None:
+            raise _wrong_type(formats)
+    record_stage("upload_read", time.perf_counter() - started, bytes=len(buffer))
+    return UploadContent(bytes(buffer), hasher.hexdigest(), file.filename, file_format)
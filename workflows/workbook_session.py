@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import io
+from typing import Any, List
+
+import pandas as pd
+
+from workflows.metrics import stage
+
+
+class WorkbookSession:
+    """
+    Öffnet eine Excel-Datei genau einmal. Kopfzeilen (z.B. für die Monatserkennung)
+    und DataFrames werden aus derselben, schreibgeschützt geladenen Arbeitsmappe gelesen.
+    """
+
+    def __init__(self, source):
+        # pd.ExcelFile lädt .xlsx mit openpyxl (read_only=True, data_only=True), .xls mit xlrd
+        with stage("excel_parse", bytes=source.getbuffer().nbytes if isinstance(source, io.BytesIO) else 0):
+            self.excel = pd.ExcelFile(source)
+
+    def __enter__(self) -> "WorkbookSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.excel.close()
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self.excel.sheet_names)
+
+    def head_rows(self, sheet_name: str, n_rows: int = 3) -> List[List[Any]]:
+        """Liest nur die ersten Zeilen eines Arbeitsblatts, ohne das ganze Blatt zu parsen"""
+        if self.excel.engine == "xlrd":
+            return self._head_rows_xlrd(sheet_name, n_rows)
+
+        ws = self.excel.book[sheet_name]
+        return [list(row) for row in ws.iter_rows(min_row=1, max_row=n_rows, values_only=True)]
+
+    def _head_rows_xlrd(self, sheet_name: str, n_rows: int) -> List[List[Any]]:
+        import xlrd
+
+        book = self.excel.book
+        sheet = book.sheet_by_name(sheet_name)
+        rows = []
+        for r in range(min(n_rows, sheet.nrows)):
+            row = []
+            for cell in sheet.row(r):
+                if cell.ctype == xlrd.XL_CELL_DATE:
+                    row.append(xlrd.xldate.xldate_as_datetime(cell.value, book.datemode))
+                elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+                    row.append(None)
+                else:
+                    row.append(cell.value)
+            rows.append(row)
+        return rows
+
+    def read_sheet(self, sheet_name: str, **kwargs) -> pd.DataFrame:
+        """Erstellt ein DataFrame aus der bereits geöffneten Arbeitsmappe (Parameter wie pd.read_excel)"""
+        with stage("excel_parse") as timing:
+            df = self.excel.parse(sheet_name=sheet_name, **kwargs)
+            timing.rows = len(df)
+        return df